@@ -53,6 +53,12 @@ class Utils:
     def now():
         return time.time()
 
+    def clock():
+        if Utils.isCPython:
+            return time.perf_counter()
+
+        return time.time()
+
     def shift(seq, n):
         n = n % len(seq)
 
@@ -61,13 +67,65 @@ class Utils:
 if Utils.isCPython:
     print('Using CPython')
 
+    from bisect import bisect_left
+    from collections import deque
     from functools import reduce
+    from heapq import nsmallest
+    from threading import Lock
+
+    try:
+        import numpy
+    except ImportError:
+        numpy = None # Optional, for `Batch`.
 elif Utils.isSkulpt:
     print('Using Skulpt Python')
 
+    numpy = None
+
+    class Lock:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *_1):
+            return False
+
+    class deque:
+        def __init__(self, iterable = ( ), maxlen = None):
+            self.items = list(iterable)
+            self.maxlen = maxlen
+
+        def __iter__(self):
+            return iter(self.items)
+
+        def __len__(self):
+            return len(self.items)
+
+        def append(self, x):
+            self.items.append(x)
+            if self.maxlen != None and len(self.items) > self.maxlen:
+                del self.items[0]
+
+        def clear(self):
+            del self.items[:]
+
     def next(g):
         return g.next()
 
+    def bisect_left(a, x):
+        lo = 0
+        hi = len(a)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if a[mid] < x:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+    def nsmallest(n, iterable, key = None):
+        return sorted(iterable, key = key)[:n]
+
     def reduce(proc, lst):
         if len(lst) == 0:
             raise TypeError('reduce() of empty sequence with no initial value')
@@ -81,6 +139,231 @@ elif Utils.isSkulpt:
 
         return r
 
+class Trace:
+    Off = 0
+    Error = 1
+    Info = 2
+    Debug = 3
+
+    Names = [ 'OFF', 'ERROR', 'INFO', 'DEBUG' ]
+
+    Decisions = 256 # Recent decisions kept by every board, recorded at `Info` level or above.
+
+    level = None # Messages above this level are neither built nor written, `Debug` if `Utils.isDebug` or `Info` if `None`.
+
+    sink = None # Writes traced messages, `Utils.write` if `None`.
+
+    def levelOf(board = None):
+        if board != None and board.trace != None:
+            return board.trace
+        if Trace.level != None:
+            return Trace.level
+
+        return Trace.Debug if Utils.isDebug else Trace.Info
+
+    def isOn(level, board = None):
+        return level <= Trace.levelOf(board)
+
+    def log(level, msg, board = None):
+        if level > Trace.levelOf(board):
+            return
+
+        if callable(msg):
+            msg = msg()
+        (Trace.sink or Utils.write)(msg)
+
+    def error(msg, board = None):
+        Trace.log(Trace.Error, msg, board)
+
+    def info(msg, board = None):
+        Trace.log(Trace.Info, msg, board)
+
+    def debug(msg, board = None):
+        Trace.log(Trace.Debug, msg, board)
+
+    def decide(board, index, handed, cards, score, considered):
+        if Trace.levelOf(board) < Trace.Info:
+            return
+
+        board.decisions.append(( Utils.now(), index, handed, cards, score, considered ))
+
+    def dump(board, write = None):
+        write = write or Utils.write
+        for ( t, index, handed, cards, score, considered ) in list(board.decisions):
+            msg = time.strftime('%H:%M:%S', time.localtime(t)) + ' @' + str(index) + \
+                (' leading' if handed == Pattern.Invalid else (' against ' + Pattern.Names[handed])) + \
+                (' passed' if cards == None else (' put ' + Card.namesOf(cards) + ' with score ' + str(score))) + \
+                ' of ' + str(considered) + ' considered'
+            write(msg)
+
+class Metrics:
+    Prefix = 'd2'
+
+    def __init__(self):
+        self.phases = { } # Phase name to `[ calls, seconds, longest ]`.
+        self.counters = { }
+
+    def time(self, phase, seconds):
+        t = self.phases.get(phase)
+        if t == None:
+            t = [ 0, 0.0, 0.0 ]
+            self.phases[phase] = t
+        t[0] += 1
+        t[1] += seconds
+        if seconds > t[2]:
+            t[2] = seconds
+
+    def count(self, name, n = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def measure(self, phase, proc, *args):
+        t = Utils.clock()
+        ret = proc(*args)
+        self.time(phase, Utils.clock() - t)
+
+        return ret
+
+    def observe(self, phase, gen):
+        while True:
+            t = Utils.clock()
+            try:
+                y = next(gen)
+            except StopIteration:
+                self.time(phase, Utils.clock() - t)
+
+                return
+            self.time(phase, Utils.clock() - t)
+
+            yield y
+
+    def merge(self, other):
+        for phase, t in other.phases.items():
+            u = self.phases.get(phase)
+            if u == None:
+                self.phases[phase] = t[:]
+            else:
+                u[0] += t[0]
+                u[1] += t[1]
+                u[2] = max(u[2], t[2])
+        for name, n in other.counters.items():
+            self.count(name, n)
+
+        return self
+
+    def snapshot(self):
+        phases = { }
+        for phase, t in self.phases.items():
+            phases[phase] = { 'calls': t[0], 'seconds': t[1], 'longest': t[2] }
+        counters = dict(self.counters)
+        turns = counters.get('turns', 0)
+        perTurn = { }
+        if turns > 0:
+            for name, n in counters.items():
+                if name != 'turns' and name != 'games':
+                    perTurn[name] = n / turns
+
+        return { 'phases': phases, 'counters': counters, 'perTurn': perTurn }
+
+    def prometheus(self, prefix = None):
+        prefix = prefix or Metrics.Prefix
+
+        lines = [ ]
+        name = prefix + '_phase_seconds'
+        lines.append('# HELP ' + name + ' Wall time spent in every game phase.')
+        lines.append('# TYPE ' + name + ' summary')
+        for phase in sorted(self.phases.keys()):
+            t = self.phases[phase]
+            lines.append(name + '_sum{phase="' + phase + '"} ' + repr(t[1]))
+            lines.append(name + '_count{phase="' + phase + '"} ' + str(t[0]))
+        name = prefix + '_phase_longest_seconds'
+        lines.append('# HELP ' + name + ' Longest single call of every game phase.')
+        lines.append('# TYPE ' + name + ' gauge')
+        for phase in sorted(self.phases.keys()):
+            lines.append(name + '{phase="' + phase + '"} ' + repr(self.phases[phase][2]))
+        for counter in sorted(self.counters.keys()):
+            name = prefix + '_' + counter + '_total'
+            lines.append('# TYPE ' + name + ' counter')
+            lines.append(name + ' ' + str(self.counters[counter]))
+
+        return '\n'.join(lines) + '\n'
+
+class Lru:
+    Capacity = 65536
+
+    Recent = 0 # Evicts the least recently used entry.
+    Inserted = 1 # Evicts the earliest inserted entry, hits don't refresh.
+
+    def __init__(self, capacity = None, policy = None):
+        self.capacity = capacity if capacity != None else Lru.Capacity
+        self.policy = policy if policy != None else Lru.Recent
+
+        self.entries = { } # Ordered by insertion, the first one goes first.
+        self.lock = Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            ret = self.entries.get(key)
+            if ret == None:
+                self.misses += 1
+
+                return None
+
+            self.hits += 1
+            if self.policy == Lru.Recent:
+                del self.entries[key]
+                self.entries[key] = ret
+
+            return ret
+
+    def put(self, key, value):
+        with self.lock:
+            if key in self.entries:
+                del self.entries[key]
+            self.entries[key] = value
+            self.shrink()
+
+        return value
+
+    def shrink(self):
+        while len(self.entries) > self.capacity:
+            del self.entries[next(iter(self.entries))]
+            self.evictions += 1
+
+    def resize(self, capacity):
+        with self.lock:
+            self.capacity = capacity
+            self.shrink()
+
+        return self
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+        return self
+
+    def stats(self):
+        looked = self.hits + self.misses
+
+        return {
+            'size': len(self.entries),
+            'capacity': self.capacity,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'ratio': self.hits / looked if looked > 0 else 0.0
+        }
+
 # Deck.
 
 class Suits:
@@ -143,6 +426,19 @@ class Points:
         return i
 
 class Card:
+    __slots__ = ( 'suit', 'index', 'id' )
+
+    All = None # The only 54 cards, by id.
+
+    def idOf(s, i):
+        if i >= Points.Joker0:
+            return 52 + i - Points.Joker0
+
+        return (i - 1) * 4 + s - 1
+
+    def of(s, i):
+        return Card.All[Card.idOf(s, i)]
+
     def namesOf(cards):
         if cards == None or len(cards) == 0:
             return '[]'
@@ -161,6 +457,7 @@ class Card:
     def __init__(self, s, i):
         self.suit = s
         self.index = i # Base 1.
+        self.id = Card.idOf(s, i)
 
     def __str__(self):
         return Points.nameOf(self.index) + Suits.nameOf(self.suit)
@@ -171,14 +468,105 @@ class Card:
 
         return self.suit < other.suit
 
+Card.All = tuple([ Card(s, i) for i in range(1, Points.Kidding + 1) for s in range(Suits.Hearts, Suits.Pikes + 1) ] + [ Card(Suits.Jokers, Points.Joker0), Card(Suits.Jokers, Points.Joker1) ])
+
+class Counts:
+    Size = 15 # One slot per point, `index - 1` for slot.
+    Bits = 3
+    Deck = ( 4, ) * 13 + ( 1, 1 ) # Counts of a whole deck.
+
+    def of(cards):
+        ret = [ 0 ] * Counts.Size
+        for c in cards:
+            if c == None:
+                continue
+
+            ret[c.index - 1] += 1
+
+        return ret
+
+    def ofIndices(indices):
+        ret = [ 0 ] * Counts.Size
+        for i in indices:
+            if i < 1 or i > Counts.Size:
+                return None
+
+            ret[i - 1] += 1
+
+        return ret
+
+    def isCounts(what):
+        return len(what) == Counts.Size and isinstance(what[0], int)
+
+    def sizeOf(counts):
+        return sum(counts)
+
+    def covers(counts, needed):
+        for i in range(Counts.Size):
+            if needed[i] > counts[i]:
+                return False
+
+        return True
+
+    def subtract(counts, needed):
+        ret = counts[:]
+        for i in range(Counts.Size):
+            ret[i] -= needed[i]
+
+        return ret
+
+    def pack(counts):
+        ret = 0
+        for i in range(Counts.Size - 1, -1, -1):
+            ret = (ret << Counts.Bits) | counts[i]
+
+        return ret
+
+    def unpack(key):
+        ret = [ 0 ] * Counts.Size
+        mask = (1 << Counts.Bits) - 1
+        for i in range(Counts.Size):
+            ret[i] = key & mask
+            key >>= Counts.Bits
+
+        return ret
+
+    def piled(counts, ordered = True):
+        piles = [ ]
+        if ordered:
+            for n in range(4, 0, -1):
+                for i in range(Counts.Size):
+                    if counts[i] == n:
+                        piles.append(Pile(i + 1, n))
+        else:
+            for i in range(Counts.Size):
+                if counts[i] > 0:
+                    piles.append(Pile(i + 1, counts[i]))
+
+        return piles
+
+    def runsOf(counts, least):
+        runs = [ 0 ] * Counts.Size # Chainable points from every slot on, with at least `least` cards.
+        n = 0
+        for i in range(Counts.Size - 1, -1, -1):
+            n = n + 1 if i + 1 < Points.Kidding and counts[i] >= least else 0
+            runs[i] = n
+
+        return runs
+
 # Player.
 
 class Player:
+    cache = None # Set to an `Lru` to share ranked moves between every player.
+
     def __init__(self):
         self.isCpu = False
         self.isLandlord = False
 
         self.hand = [ ]
+        self.ordered = True # Whether `hand` is sorted.
+        self.buckets = [ [ ] for _ in range(Counts.Size) ] # Card ids of every slot, in `hand` order.
+        self.counts = [ 0 ] * Counts.Size # Rank-count vector of `hand`.
 
         self.demanding = 0
 
@@ -192,6 +580,10 @@ class Player:
         self.isLandlord = False
 
         del self.hand[:]
+        self.ordered = True
+        for i in range(Counts.Size):
+            del self.buckets[i][:]
+            self.counts[i] = 0
 
         self.demanding = 0
 
@@ -200,53 +592,76 @@ class Player:
         return self
 
     def add(self, card):
-        self.hand.append(Card(card.suit, card.index))
+        card = Card.All[card.id]
+        if len(self.hand) > 0 and card < self.hand[-1]:
+            self.ordered = False
+        self.hand.append(card)
+        self.buckets[card.index - 1].append(card.id)
+        self.counts[card.index - 1] += 1
 
         return self
 
     def remove(self, card):
-        for i in range(len(self.hand)):
-            c = self.hand[i]
-            if c == card or (c.suit == card.suit and c.index == card.index):
-                del self.hand[i]
+        bucket = self.buckets[card.index - 1]
+        if card.id not in bucket:
+            return self
 
-                return self
+        card = Card.All[card.id]
+        del self.hand[self.orderOf(card)]
+        bucket.remove(card.id)
+        self.counts[card.index - 1] -= 1
 
         return self
 
     def sort(self):
         self.hand.sort()
+        self.ordered = True
+        for bucket in self.buckets:
+            bucket.sort()
 
         return self
 
+    def orderOf(self, card):
+        if self.ordered:
+            i = bisect_left(self.hand, card)
+            if i < len(self.hand) and self.hand[i] is card:
+                return i
+
+        return self.hand.index(card)
+
     def demand(self, index, board, evaluated):
         return False
 
-    def pick(self, indices, auxiliary = None, cond = None):
-        def pick(index, orders, cards, hand, cond):
-            order = Pattern.indexOf(hand, None, index)
-            card = Pattern.cardOf(hand, None, index)
-            if order < 0 or card == None:
+    def pick(self, indices, auxiliary = None, cond = None, board = None):
+        def pick(index, orders, cards, taken, cond):
+            bucket = self.buckets[index - 1]
+            n = taken[index - 1]
+            if n >= len(bucket):
                 return False
+            card = Card.All[bucket[n]]
             if cond != None and not cond(card):
                 return False
 
-            orders.append(order)
+            orders.append(self.orderOf(card))
             cards.append(card)
-            hand[order] = None
+            taken[index - 1] = n + 1
 
             return True
 
+        needed = Counts.ofIndices(indices)
+        if needed == None or not Counts.covers(self.counts, needed):
+            return ( None, None, None )
+
         orders = [ ]
         cards = [ ]
-        hand = self.hand[:]
+        taken = [ 0 ] * Counts.Size
 
         for index in indices:
-            if not pick(index, orders, cards, hand, cond):
+            if not pick(index, orders, cards, taken, cond):
                 return ( None, None, None )
 
         if auxiliary != None:
-            piles = Pile.of(hand, False)
+            piles = Counts.piled(Counts.subtract(self.counts, needed), False)
             for aux in auxiliary:
                 got = False
                 for i in range(len(piles)):
@@ -255,7 +670,7 @@ class Player:
                         continue
 
                     for j in range(aux):
-                        pick(pile.index, orders, cards, hand, None)
+                        pick(pile.index, orders, cards, taken, None)
                     del piles[i]
                     got = True
 
@@ -273,88 +688,96 @@ class Player:
         piles = Pile.of(cards)
         cards.sort(key = lambda card: Pattern.firstIndexOf(piles, lambda p, c: p.index == c.index, card))
 
-        msg = 'Picking cards: ' + Card.namesOf(cards) + ' of indices ' + str(indices)
-        Utils.debug(msg)
+        if Trace.isOn(Trace.Debug, board):
+            Trace.debug('Picking cards: ' + Card.namesOf(cards) + ' of indices ' + str(indices), board)
+
+        return ( orders, cards, len(self.hand) - len(cards) ) # Counts the rest only, see `Pattern.priorityOf`.
 
-        hand = list(filter(lambda c: c != None, hand))
+    def scored(counts, hand, key, length):
+        rest = sum(counts)
+        for move in Moves.each(counts, hand, key, length):
+            if Evaluator.isRanking:
+                yield ( move, Evaluator.priorityOf(move, counts) )
+            else:
+                yield ( move, Pattern.priorityOfMove(move, rest - move[2]) )
 
-        return ( orders, cards, hand )
+    def best(counts, hand, key, length):
+        rest = sum(counts)
+        ret = None
+        for move in Moves.each(counts, hand, key, length):
+            score = Pattern.priorityOfMove(move, rest - move[2])
+            if ret == None or score < ret[1]:
+                ret = ( move, score )
 
-    def search(self, index, board, hand):
-        valid = [ ]
-        holding = Pile.of(self.hand, False)
+        return [ ] if ret == None else [ ret ] # Like `Player.rank` for the top move only, but without the scoring pipeline.
 
+    def rank(counts, hand, key, length, metrics = None, top = None):
         if hand == Pattern.Invalid:
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Straight_x3_2n)
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Straight_x3_n)
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Straight_x3)
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Straight_x2)
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Straight)
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Quadruple_2_2)
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Quadruple_1_1)
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Triple_2)
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Triple_1)
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Triple)
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Double)
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Single)
-            valid += Pattern.pickQuadruple(board, self, index, holding)
-            valid += Pattern.pickJokers(board, self, index, holding)
-        elif hand == Pattern.Single:
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Single)
-            valid += Pattern.pickQuadruple(board, self, index, holding)
-            valid += Pattern.pickJokers(board, self, index, holding)
-        elif hand == Pattern.Double:
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Double)
-            valid += Pattern.pickQuadruple(board, self, index, holding)
-            valid += Pattern.pickJokers(board, self, index, holding)
-        elif hand == Pattern.Triple:
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Triple)
-            valid += Pattern.pickQuadruple(board, self, index, holding)
-            valid += Pattern.pickJokers(board, self, index, holding)
-        elif hand == Pattern.Triple_1:
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Triple_1)
-            valid += Pattern.pickQuadruple(board, self, index, holding)
-            valid += Pattern.pickJokers(board, self, index, holding)
-        elif hand == Pattern.Triple_2:
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Triple_2)
-            valid += Pattern.pickQuadruple(board, self, index, holding)
-            valid += Pattern.pickJokers(board, self, index, holding)
-        elif hand == Pattern.Quadruple:
-            valid += Pattern.pickQuadruple(board, self, index, holding)
-            valid += Pattern.pickJokers(board, self, index, holding)
-        elif hand == Pattern.Quadruple_1_1:
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Quadruple_1_1)
-            valid += Pattern.pickQuadruple(board, self, index, holding)
-            valid += Pattern.pickJokers(board, self, index, holding)
-        elif hand == Pattern.Quadruple_2_2:
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Quadruple_2_2)
-            valid += Pattern.pickQuadruple(board, self, index, holding)
-            valid += Pattern.pickJokers(board, self, index, holding)
-        elif hand == Pattern.Straight:
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Straight)
-            valid += Pattern.pickQuadruple(board, self, index, holding)
-            valid += Pattern.pickJokers(board, self, index, holding)
-        elif hand == Pattern.Straight_x2:
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Straight_x2)
-            valid += Pattern.pickQuadruple(board, self, index, holding)
-            valid += Pattern.pickJokers(board, self, index, holding)
-        elif hand == Pattern.Straight_x3:
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Straight_x3)
-            valid += Pattern.pickQuadruple(board, self, index, holding)
-            valid += Pattern.pickJokers(board, self, index, holding)
-        elif hand == Pattern.Straight_x3_n:
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Straight_x3_n)
-            valid += Pattern.pickQuadruple(board, self, index, holding)
-            valid += Pattern.pickJokers(board, self, index, holding)
-        elif hand == Pattern.Straight_x3_2n:
-            valid += Pattern.pickSome(board, self, index, holding, Pattern.Straight_x3_2n)
-            valid += Pattern.pickQuadruple(board, self, index, holding)
-            valid += Pattern.pickJokers(board, self, index, holding)
-        elif hand == Pattern.Jokers:
-            pass
+            key = 0
+            length = 0
+
+        cache = Player.cache
+        if cache != None:
+            state = ( Canon.handOf(counts), hand, key, length, Evaluator.isRanking )
+            ranked = cache.get(state)
+            if ranked != None:
+                return ranked if top == None else ranked[:top]
+
+        if top == 1 and cache == None and metrics == None and not Evaluator.isRanking and not Batch.isOn():
+            return Player.best(counts, hand, key, length)
+
+        if Batch.isOn() and not Evaluator.isRanking:
+            scored = Batch.scored(counts, hand, key, length)
+        else:
+            scored = Player.scored(counts, hand, key, length)
+        if metrics != None:
+            scored = list(scored)
+            metrics.count('candidates', len(scored)) # Every move generated gets its priority evaluated once.
+        if top != None and cache == None:
+            return nsmallest(top, scored, key = lambda r: r[1])
+
+        ranked = list(scored)
+        ranked.sort(key = lambda r: r[1])
+
+        if cache != None:
+            cache.put(state, ranked)
+
+        return ranked if top == None else ranked[:top]
+
+    def locate(self, indices, metrics = None):
+        if metrics != None:
+            metrics.count('picks')
+
+        cards = [ ]
+        taken = [ 0 ] * Counts.Size
+        for i in indices:
+            cards.append(Card.All[self.buckets[i - 1][taken[i - 1]]])
+            taken[i - 1] += 1
+        picked = list(map(lambda c: self.orderOf(c), cards))
+
+        return ( picked, cards )
+
+    def search(self, index, board, hand, top = None, accept = None):
+        ( _1, key, length ) = Pattern.lookup(board.stack[-1].piled())
+
+        if accept == None:
+            ranked = Player.rank(self.counts, hand, key, length, board.metrics, top)
+        else:
+            ranked = [ ]
+            for r in Player.scored(self.counts, hand, key, length):
+                if accept(r[0], r[1]):
+                    ranked.append(r)
+
+                    break
+
+        valid = [ ]
+        for ( move, score ) in ranked:
+            ( picked, cards ) = self.locate(move[3], board.metrics)
+
+            valid.append(( picked, cards, score ))
 
-        valid = list(filter(lambda v: v != None, valid))
-        valid.sort(key = lambda v: v[2])
+        if board.metrics != None:
+            board.metrics.count('searches')
 
         return valid
 
@@ -369,7 +792,7 @@ class Player:
         if -1 in indices:
             return False
 
-        ( orders, cards, _1 ) = self.pick(indices)
+        ( orders, cards, _1 ) = self.pick(indices, None, None, board)
 
         put[0] = orders
         put[1] = cards
@@ -384,11 +807,13 @@ class Player:
         return ret
 
 class Cpu(Player):
-    def __init__(self):
+    def __init__(self, solver = None):
         Player.__init__(self)
 
         self.isCpu = True
 
+        self.solver = solver # Set to an `Endgame` to play out short endings perfectly.
+
     def demand(self, index, board, evaluated):
         if self.wait != None and not self.wait.canDemand():
             return False
@@ -411,17 +836,32 @@ class Cpu(Player):
         hyped = len(board.stack[-1].cards) >= 4 or (whose != None and len(whose.hand) <= 2)
         mine = board.stack[-1].owner == index
 
+        if self.solver != None:
+            solved = self.solver.think(index, board)
+            if solved != None:
+                ( won, move ) = solved
+                if won:
+                    if move == None:
+                        Trace.decide(board, index, handed, None, None, self.solver.visited)
+                    else:
+                        ( put[0], put[1] ) = self.locate(move[3], board.metrics)
+                        Trace.decide(board, index, handed, put[1], 0, self.solver.visited)
+
+                    return True
+
         if friendly and hyped and not mine:
+            Trace.decide(board, index, handed, None, None, 0)
+
             return True
 
-        valid = self.search(index, board, handed)
-        for v in valid:
-            cards = v[1]
-            score = v[2]
-            msg = 'Considering cards: ' + Card.namesOf(cards) + ' with score ' + str(score)
-            Utils.debug(msg)
+        valid = self.search(index, board, handed, None if Trace.isOn(Trace.Info, board) else 1)
+        if Trace.isOn(Trace.Debug, board):
+            for v in valid:
+                Trace.debug('Considering cards: ' + Card.namesOf(v[1]) + ' with score ' + str(v[2]), board)
 
         if len(valid) == 0:
+            Trace.decide(board, index, handed, None, None, 0)
+
             return True
 
         v = valid[0]
@@ -431,6 +871,403 @@ class Cpu(Player):
         put[0] = orders
         put[1] = cards
 
+        Trace.decide(board, index, handed, cards, v[2], len(valid))
+
+        return True
+
+class MonteCarlo(Cpu):
+    Seconds = 0.2 # Thinking budget per move.
+    Samples = 256 # Most deals sampled per move.
+    Width = 8 # Most candidate moves compared per move.
+    Batch = 8 # Deals per task sent to a worker.
+    Margin = 0.02 # Seconds left for the workers to report back.
+    Poll = 0.005 # Seconds waited at most for any task to finish.
+
+    current = None # Generation of the decision being made, shared with the workers.
+
+    def playout(state):
+        while True:
+            turn = state.turn
+            lead = state.lead
+            counts = state.hands[turn]
+            if lead == None:
+                ranked = Player.rank(counts, Pattern.Invalid, 0, 0, None, 1)
+            else:
+                friendly = turn != state.landlord and state.owner != state.landlord
+                hyped = lead[2] >= 4 or state.sizes[state.owner] <= 2
+                ranked = [ ] if friendly and hyped else Player.rank(counts, lead[0], lead[1], lead[2], None, 1)
+            move = ranked[0][0] if len(ranked) > 0 else None
+            state.applyMove(move)
+            if move != None and state.sizes[turn] == 0:
+                return ( turn, state.times )
+
+    def deal(position, rnd):
+        ( index, mine, unseen, sizes, known, landlord, _1, _2 ) = position
+
+        pool = [ ]
+        for i in range(Counts.Size):
+            pool += [ i + 1 ] * (unseen[i] - known[i])
+        rnd.shuffle(pool)
+
+        hands = [ None, None, None ]
+        hands[index] = mine[:]
+        n = 0
+        for seat in range(3):
+            if seat == index:
+                continue
+
+            counts = known[:] if seat == landlord else [ 0 ] * Counts.Size
+            need = sizes[seat] - sum(counts)
+            for i in pool[n:n + need]:
+                counts[i - 1] += 1
+            n += need
+            hands[seat] = counts
+
+        return hands
+
+    def share(current):
+        MonteCarlo.current = current
+
+    def isCurrent(generation, stop):
+        if stop != None and Utils.now() > stop:
+            return False
+
+        return generation == None or MonteCarlo.current == None or MonteCarlo.current.value == generation
+
+    def work(task):
+        ( position, moves, samples, seed, generation, stop ) = task
+        ( index, _1, _2, _3, _4, landlord, lead, owner ) = position
+        ours = index == landlord
+        rnd = random.Random(seed)
+
+        totals = [ 0 ] * len(moves)
+        done = 0
+        for _ in range(samples):
+            if not MonteCarlo.isCurrent(generation, stop): # Out of time, or the decision is made already.
+                break
+
+            done += 1
+            dealt = State(MonteCarlo.deal(position, rnd), landlord, index, lead, owner)
+            for k in range(len(moves)):
+                move = moves[k]
+                state = dealt.clone().applyMove(move)
+                if state.sizes[index] == 0:
+                    ( winner, times ) = ( index, state.times )
+                else:
+                    ( winner, times ) = MonteCarlo.playout(state)
+                won = (winner == landlord) == ours
+                totals[k] += times if won else -times
+
+        return ( totals, done )
+
+    def __init__(self, seconds = None, samples = None, width = None, workers = None, batch = None, seed = None):
+        Cpu.__init__(self)
+
+        self.seconds = MonteCarlo.Seconds if seconds == None else seconds
+        self.samples = MonteCarlo.Samples if samples == None else samples
+        self.width = MonteCarlo.Width if width == None else width
+        self.workers = workers # None for one per CPU, 0 or 1 for in-process.
+        self.batch = MonteCarlo.Batch if batch == None else batch
+        self.random = random.Random(seed)
+
+        self.workerPool = None
+        self.generation = None # `MonteCarlo.current` of the workers.
+
+    def close(self):
+        if self.workerPool != None:
+            self.workerPool.terminate()
+            self.workerPool = None
+            self.generation = None
+
+        return self
+
+    def positionOf(self, index, board, lead, owner):
+        played = [ 0 ] * Counts.Size
+        spent = [ 0 ] * Counts.Size # Played by the landlord.
+        for put in board.stack:
+            for c in put.cards:
+                played[c.index - 1] += 1
+                if put.owner == board.landlord:
+                    spent[c.index - 1] += 1
+
+        unseen = [ Counts.Deck[i] - self.counts[i] - played[i] for i in range(Counts.Size) ]
+        known = [ 0 ] * Counts.Size # Reserved cards which must still be on the landlord's hand.
+        if index != board.landlord:
+            reserved = Counts.of(board.reserved)
+            known = [ max(0, reserved[i] - spent[i]) for i in range(Counts.Size) ]
+        sizes = list(map(lambda p: len(p.hand), board.players))
+
+        return ( index, self.counts[:], unseen, sizes, known, board.landlord, lead, owner )
+
+    def evaluate(self, position, moves, metrics = None):
+        deadline = Utils.clock() + self.seconds
+        totals = [ 0 ] * len(moves)
+        n = 0
+
+        def gather(result):
+            ( rewards, samples ) = result
+            for k in range(len(moves)):
+                totals[k] += rewards[k]
+
+            return samples
+
+        workers = self.workers
+        if workers == None and Utils.isCPython:
+            import multiprocessing
+
+            workers = multiprocessing.cpu_count()
+        if workers == None or workers <= 1 or not Utils.isCPython:
+            while n < self.samples and Utils.clock() < deadline:
+                n += gather(MonteCarlo.work(( position, moves, 1, self.random.getrandbits(32), None, None )))
+        else:
+            import multiprocessing
+
+            if self.workerPool == None:
+                self.generation = multiprocessing.Value('l', 0)
+                self.workerPool = multiprocessing.Pool(workers, MonteCarlo.share, ( self.generation, ))
+            generation = self.generation.value
+            stop = Utils.now() + max(0, self.seconds - MonteCarlo.Margin) # Tasks stop sampling by then to make it in time.
+            pending = [ ]
+            submitted = 0
+            while True:
+                while len(pending) < workers and submitted < self.samples:
+                    samples = min(self.batch, self.samples - submitted)
+                    task = ( position, moves, samples, self.random.getrandbits(32), generation, stop )
+                    pending.append(self.workerPool.apply_async(MonteCarlo.work, ( task, )))
+                    submitted += samples
+                left = deadline - Utils.clock()
+                if len(pending) == 0 or left <= 0:
+                    break
+
+                ready = list(filter(lambda r: r.ready(), pending))
+                if len(ready) == 0:
+                    if submitted < self.samples:
+                        n += gather(MonteCarlo.work(( position, moves, 1, self.random.getrandbits(32), None, stop ))) # Helps out meanwhile.
+                        submitted += 1
+                    else:
+                        pending[0].wait(min(left, MonteCarlo.Poll))
+
+                    continue
+                for r in ready:
+                    pending.remove(r)
+                    n += gather(r.get())
+            self.generation.value = generation + 1 # Stops what is left of this decision.
+
+        if metrics != None:
+            metrics.count('samples', n)
+
+        return ( totals, n )
+
+    def think(self, index, board, put):
+        if self.wait != None and not self.wait.canThink():
+            return False
+
+        handed = board.stack[-1].handed(index)
+        ( _1, key, length ) = Pattern.lookup(board.stack[-1].piled())
+        moves = list(map(lambda r: r[0], Player.rank(self.counts, handed, key, length, board.metrics, self.width)))
+        if handed == Pattern.Invalid:
+            ( lead, owner ) = ( None, index )
+        else:
+            ( lead, owner ) = ( ( handed, key, length ), board.stack[-1].owner )
+            moves.append(None)
+        if len(moves) < 2:
+            return Cpu.think(self, index, board, put)
+
+        ( totals, n ) = self.evaluate(self.positionOf(index, board, lead, owner), moves, board.metrics)
+        if n == 0:
+            return Cpu.think(self, index, board, put)
+
+        best = 0
+        for k in range(1, len(moves)):
+            if totals[k] > totals[best]:
+                best = k
+        move = moves[best]
+        if move == None:
+            Trace.decide(board, index, handed, None, None, len(moves))
+
+            return True
+
+        ( put[0], put[1] ) = self.locate(move[3], board.metrics)
+
+        Trace.decide(board, index, handed, put[1], totals[best] / n, len(moves))
+
+        return True
+
+class Mcts(MonteCarlo):
+    Seconds = 0.2 # Thinking budget per move.
+    Exploration = 1.4
+    Nodes = 1 << 18 # Most nodes kept between turns.
+
+    Visits = 0
+    Reward = 1
+    Available = 2
+    Children = 3
+
+    def keyOf(move):
+        if move == None:
+            return None
+
+        return ( move[0], move[1], tuple(move[3]) )
+
+    def childOf(node, cards):
+        children = node[Mcts.Children]
+        if cards == None:
+            return children.get(None)
+
+        packed = Canon.cardsOf(cards)
+        for ( key, child ) in children.items():
+            if key != None and Canon.handOf(Counts.ofIndices(key[2])) == packed:
+                return child
+
+        return None
+
+    def __init__(self, iterations = None, seconds = None, exploration = None, seed = None):
+        MonteCarlo.__init__(self, workers = 0, seed = seed)
+
+        self.seconds = Mcts.Seconds if seconds == None and iterations == None else seconds # None for no time limit.
+
+        self.iterations = iterations # None for as many as `seconds` allows.
+        self.exploration = Mcts.Exploration if exploration == None else exploration
+
+        self.root = None # `[ visits, reward, available, children ]` of the last decision.
+        self.size = 0
+        self.game = None
+        self.mark = 0 # Length of the board history when the last decision was made.
+
+        self.speed = 0 # Iterations per second of the last decision.
+
+    def reuse(self, board):
+        if self.root == None or self.game != board.game or self.mark > len(board.history) or self.size > Mcts.Nodes:
+            return None
+
+        node = self.root
+        for ( _1, cards ) in board.history[self.mark:]:
+            node = Mcts.childOf(node, cards)
+            if node == None:
+                return None
+
+        return node
+
+    def iterate(self, root, position):
+        ( index, _1, _2, _3, _4, landlord, lead, owner ) = position
+        state = State(MonteCarlo.deal(position, self.random), landlord, index, lead, owner)
+        node = root
+        path = [ ]
+        while True:
+            turn = state.turn
+            moves = state.moves()
+
+            children = node[Mcts.Children]
+            untried = [ ]
+            best = None
+            value = None
+            for move in moves:
+                key = Mcts.keyOf(move)
+                child = children.get(key)
+                if child == None:
+                    untried.append(( key, move ))
+
+                    continue
+
+                child[Mcts.Available] += 1
+                if len(untried) > 0:
+                    continue
+                v = child[Mcts.Reward] / child[Mcts.Visits] + self.exploration * math.sqrt(math.log(child[Mcts.Available]) / child[Mcts.Visits])
+                if value == None or v > value:
+                    ( best, value ) = ( ( child, move ), v )
+            expanding = len(untried) > 0
+            if expanding:
+                ( key, move ) = untried[self.random.randrange(len(untried))]
+                child = [ 0, 0, 1, { } ]
+                children[key] = child
+                self.size += 1
+            else:
+                ( child, move ) = best
+
+            path.append(( child, turn ))
+            node = child
+            state.applyMove(move)
+            if move != None and state.sizes[turn] == 0:
+                ( winner, times ) = ( turn, state.times )
+
+                break
+
+            if expanding:
+                ( winner, times ) = MonteCarlo.playout(state)
+
+                break
+
+        root[Mcts.Visits] += 1
+        for ( n, mover ) in path:
+            n[Mcts.Visits] += 1
+            won = (winner == landlord) == (mover == landlord)
+            n[Mcts.Reward] += times if won else -times
+
+    def think(self, index, board, put):
+        if self.wait != None and not self.wait.canThink():
+            return False
+
+        handed = board.stack[-1].handed(index)
+        ( _1, key, length ) = Pattern.lookup(board.stack[-1].piled())
+        if handed == Pattern.Invalid:
+            ( lead, owner ) = ( None, index )
+            moves = Moves.of(self.counts)
+        else:
+            ( lead, owner ) = ( ( handed, key, length ), board.stack[-1].owner )
+            moves = Moves.of(self.counts, handed, key, length)
+            moves.append(None)
+        if len(moves) < 2:
+            return Cpu.think(self, index, board, put)
+
+        root = self.reuse(board)
+        if root == None:
+            root = [ 0, 0, 0, { } ]
+            self.size = 1
+        reused = root[Mcts.Visits]
+
+        position = self.positionOf(index, board, lead, owner)
+        seconds = self.seconds
+        if seconds == None and self.iterations == None:
+            seconds = Mcts.Seconds
+        start = Utils.clock()
+        deadline = None if seconds == None else start + seconds
+        n = 0
+        created = self.size
+        while (self.iterations == None or n < self.iterations) and (deadline == None or Utils.clock() < deadline):
+            self.iterate(root, position)
+            n += 1
+        elapsed = Utils.clock() - start
+        self.speed = n / elapsed if elapsed > 0 else 0
+
+        if board.metrics != None:
+            board.metrics.count('iterations', n)
+            board.metrics.count('nodes', self.size - created)
+        if Trace.isOn(Trace.Debug, board):
+            Trace.debug('Searched ' + str(n) + ' iterations over ' + str(reused) + ' reused, ' + str(self.size) + ' nodes, ' + str(int(self.speed)) + ' iterations/s', board)
+
+        best = None
+        for move in moves:
+            child = root[Mcts.Children].get(Mcts.keyOf(move))
+            if child != None and (best == None or child[Mcts.Visits] > best[1][Mcts.Visits]):
+                best = ( move, child )
+
+        self.root = root
+        self.game = board.game
+        self.mark = len(board.history)
+
+        if best == None:
+            return Cpu.think(self, index, board, put)
+
+        ( move, child ) = best
+        if move == None:
+            Trace.decide(board, index, handed, None, None, len(moves))
+
+            return True
+
+        ( put[0], put[1] ) = self.locate(move[3], board.metrics)
+
+        Trace.decide(board, index, handed, put[1], child[Mcts.Reward] / child[Mcts.Visits], len(moves))
+
         return True
 
 class You(Player):
@@ -474,6 +1311,8 @@ class You(Player):
 # Board.
 
 class Pile:
+    __slots__ = ( 'index', 'count' )
+
     def of(cards, ordered = True):
         cards = list(filter(lambda c: c != None, cards[:]))
         cards.sort()
@@ -497,9 +1336,9 @@ class Pile:
 
         return piles
 
-    def __init__(self):
-        self.index = 0
-        self.count = 0
+    def __init__(self, index = 0, count = 0):
+        self.index = index
+        self.count = count
 
     def __str__(self):
         return '<' + str(self.index) + ', ' + str(self.count) + '>'
@@ -545,6 +1384,10 @@ class Pattern:
 
     Passed = 'passed'
 
+    Table = None # Packed counts to `( hand, key, length )`, see `Pattern.tabulate`.
+
+    isChecking = False # Whether to check the table against `Pattern.classify`.
+
     Names = {
         Invalid: 'Invalid',
         Single: 'Single',
@@ -589,12 +1432,29 @@ class Pattern:
         kidding = Pattern.firstIndexOf(piles, lambda p, _1: p.index == Points.Kidding, None)
         kidding = 0 if kidding == -1 else (piles[kidding].count * Points.valueOf(Points.Kidding))
 
-        post = len(rest) / 17 * 20000
+        post = rest / 17 * 20000 # Number of cards left after this put.
 
         total = (hand + value + kidding) + post # Calculates the priority.
 
         return total
 
+    def priorityOfMove(move, rest):
+        hand = move[0]
+
+        values = Points.Values
+        value = 0
+        kidding = 0
+        for i in move[3]:
+            value += values[i - 1]
+            if i == Points.Kidding:
+                kidding += values[Points.Kidding - 1]
+
+        post = rest / 17 * 20000
+
+        total = (hand + value + kidding) + post # Same as `Pattern.priorityOf`.
+
+        return total
+
     def cardOf(cards, suit, index):
         if len(cards) == 0:
             return None
@@ -653,7 +1513,110 @@ class Pattern:
 
         return False
 
+    def tabulate():
+        table = { }
+
+        def put(hand, counts, key):
+            table[Counts.pack(counts)] = ( hand, key, sum(counts) )
+
+        def chains(n, least):
+            for start in range(1, Points.Kidding - n + 1):
+                if n >= least:
+                    yield list(range(start, start + n))
+
+        def combinations(indices, n):
+            if n == 0:
+                yield [ ]
+
+                return
+            for i in range(len(indices) - n + 1):
+                for rest in combinations(indices[i + 1:], n - 1):
+                    yield [ indices[i] ] + rest
+
+        normal = list(range(1, Points.Kidding + 1)) # Without jokers.
+        chainable = list(range(1, Points.Kidding)) # Without jokers and kidding.
+
+        for i in range(1, Counts.Size + 1):
+            counts = [ 0 ] * Counts.Size
+            counts[i - 1] = 1
+            put(Pattern.Single, counts, i)
+        for i in normal:
+            for n, hand in (( 2, Pattern.Double ), ( 3, Pattern.Triple ), ( 4, Pattern.Quadruple )):
+                counts = [ 0 ] * Counts.Size
+                counts[i - 1] = n
+                put(hand, counts, i)
+        counts = [ 0 ] * Counts.Size
+        counts[Points.Joker0 - 1] = 1
+        counts[Points.Joker1 - 1] = 1
+        put(Pattern.Jokers, counts, Points.Joker0)
+
+        for i in normal:
+            others = list(filter(lambda j: j != i, normal))
+            for j in others:
+                for n, hand in (( 1, Pattern.Triple_1 ), ( 2, Pattern.Triple_2 )):
+                    counts = [ 0 ] * Counts.Size
+                    counts[i - 1] = 3
+                    counts[j - 1] = n
+                    put(hand, counts, i)
+            for ks in combinations(others, 2):
+                for n, hand in (( 1, Pattern.Quadruple_1_1 ), ( 2, Pattern.Quadruple_2_2 )):
+                    counts = [ 0 ] * Counts.Size
+                    counts[i - 1] = 4
+                    for k in ks:
+                        counts[k - 1] = n
+                    put(hand, counts, i)
+
+        for n in range(1, len(chainable) + 1):
+            for m, least, hand in (( 1, 5, Pattern.Straight ), ( 2, 3, Pattern.Straight_x2 ), ( 3, 2, Pattern.Straight_x3 )):
+                for chain in chains(n, least):
+                    counts = [ 0 ] * Counts.Size
+                    for i in chain:
+                        counts[i - 1] = m
+                    put(hand, counts, chain[0])
+            for chain in chains(n, 2):
+                others = list(filter(lambda j: not j in chain, chainable))
+                for ks in combinations(others, n):
+                    for m, hand in (( 1, Pattern.Straight_x3_n ), ( 2, Pattern.Straight_x3_2n )):
+                        counts = [ 0 ] * Counts.Size
+                        for i in chain:
+                            counts[i - 1] = 3
+                        for k in ks:
+                            counts[k - 1] = m
+                        put(hand, counts, chain[0])
+
+        return table
+
+    def lookup(piles):
+        if Counts.isCounts(piles):
+            key = Counts.pack(piles)
+            piles = None
+        else:
+            key = 0
+            for p in piles:
+                key |= p.count << (Counts.Bits * (p.index - 1))
+
+        ret = Pattern.Table.get(key)
+        if ret == None or Pattern.isChecking:
+            if piles == None:
+                piles = Counts.piled(Counts.unpack(key))
+            if ret == None:
+                first = 0 if len(piles) == 0 else piles[0].index
+                length = 0
+                for p in piles:
+                    length += p.count
+                ret = ( Pattern.Invalid, first, length )
+            if Pattern.isChecking and ret[0] != Pattern.classify(piles):
+                raise Exception('Mismatched hand of ' + str(list(map(str, piles))))
+
+        return ret
+
     def handOf(piles):
+        return Pattern.lookup(piles)[0]
+
+    def classify(piles):
+        if Counts.isCounts(piles):
+            piles = Counts.piled(piles)
+
         hand = Pattern.Invalid
 
         def count(pile):
@@ -764,7 +1727,7 @@ class Pattern:
         return ret
 
     def compare(lpiles, rpiles):
-        def compare(lhand, rhand, lpiles, rpiles):
+        def compare(lhand, rhand, lentry, rentry):
             if lhand != rhand:
                 if lhand == Pattern.Invalid:
                     return -1
@@ -778,16 +1741,11 @@ class Pattern:
                     return 1
                 else:
                     return -1
-            else:
-                if len(lpiles) != len(rpiles):
-                    return -1
-
-                for i in range(len(lpiles)):
-                    if lpiles[i].count != rpiles[i].count:
-                        return -1
+            elif lhand == Pattern.Invalid or lentry[2] != rentry[2]:
+                return -1
 
-            li = lpiles[0].index
-            ri = rpiles[0].index
+            li = lentry[1]
+            ri = rentry[1]
             if li < ri:
                 return -1
             elif li > ri:
@@ -795,9 +1753,11 @@ class Pattern:
             else:
                 return 0
 
-        lhand = Pattern.handOf(lpiles)
-        rhand = Pattern.handOf(rpiles)
-        cm = compare(lhand, rhand, lpiles, rpiles)
+        lentry = Pattern.lookup(lpiles)
+        rentry = Pattern.lookup(rpiles)
+        lhand = lentry[0]
+        rhand = rentry[0]
+        cm = compare(lhand, rhand, lentry, rentry)
 
         hand = lhand
         rel = cm
@@ -823,7 +1783,7 @@ class Pattern:
                 continue
 
             indices = [ pile.index ] * 4
-            ( orders, cards, rest ) = player.pick(indices)
+            ( orders, cards, rest ) = player.pick(indices, None, None, board)
             score = Pattern.priorityOf(cards, rest)
 
             if orders != None and cards != None and score != None:
@@ -832,22 +1792,16 @@ class Pattern:
         return possibilities
 
     def pickJokers(board, player, index, holding):
-        cards = None
-        orders = None
-        index = Points.nameToIndex(':)')
-        order0 = Pattern.indexOf(player.hand, None, index)
-        card0 = Pattern.cardOf(player.hand, None, index)
-        index = Points.nameToIndex(':D')
-        order1 = Pattern.indexOf(player.hand, None, index)
-        card1 = Pattern.cardOf(player.hand, None, index)
-        if card0 != None and card1 != None:
-            cards = [ card0, card1 ]
-        if order0 != None and order1 != None:
-            orders = [ order0, order1 ]
-        rest = list(filter(lambda c: c != card0 and c != card1, player.hand[:]))
-        score = Pattern.priorityOf(cards, rest)
-
-        if orders != None and cards != None and score != None:
+        joker0 = player.buckets[Points.nameToIndex(':)') - 1]
+        joker1 = player.buckets[Points.nameToIndex(':D') - 1]
+        if len(joker0) == 0 or len(joker1) == 0:
+            return [ ]
+
+        cards = [ Card.All[joker0[0]], Card.All[joker1[0]] ]
+        orders = list(map(lambda c: player.orderOf(c), cards))
+        score = Pattern.priorityOf(cards, len(player.hand) - 2)
+
+        if score != None:
             return [ ( orders, cards, score ) ]
 
         return [ ]
@@ -870,128 +1824,961 @@ class Pattern:
             indexIs = indexIsGt if handed == hand else indexIsAny
             start = Pattern.firstIndexOf(holding, indexIs, board.stack[-1].cards[0])
             if start < 0:
-                Utils.debug('No key card greater than put')
+                Trace.debug('No key card greater than put', board)
+
+                return possibilities
+
+        pointed = 0
+        straight = None
+        auxiliary = None
+        if hand == Pattern.Single:
+            pointed = 1
+        elif hand == Pattern.Double:
+            pointed = 2
+        elif hand == Pattern.Triple:
+            pointed = 3
+        elif hand == Pattern.Triple_1:
+            pointed = 3
+            auxiliary = [ 1 ]
+        elif hand == Pattern.Triple_2:
+            pointed = 3
+            auxiliary = [ 2 ]
+        elif hand == Pattern.Quadruple_1_1:
+            pointed = 4
+            auxiliary = [ 1, 1 ]
+        elif hand == Pattern.Quadruple_2_2:
+            pointed = 4
+            auxiliary = [ 2, 2 ]
+        elif hand == Pattern.Straight:
+            pointed = 1
+            if handed == hand:
+                straight = len(board.stack[-1].cards)
+            else:
+                straight = 5
+                if len(holding) > straight:
+                    straight = range(len(holding), straight - 1, -1)
+        elif hand == Pattern.Straight_x2:
+            pointed = 2
+            if handed == hand:
+                straight = int(len(board.stack[-1].cards) / 2)
+            else:
+                straight = 3
+                most = len(holding)
+                if most > straight:
+                    straight = range(most, straight - 1, -1)
+        elif hand == Pattern.Straight_x3:
+            pointed = 3
+            if handed == hand:
+                straight = int(len(board.stack[-1].cards) / 3)
+            else:
+                straight = 2
+                most = len(holding)
+                if most > straight:
+                    straight = range(most, straight - 1, -1)
+        elif hand == Pattern.Straight_x3_n:
+            pointed = 3
+            if handed == hand:
+                straight = int(len(board.stack[-1].cards) / 4)
+                auxiliary = [ 1 ] * straight
+            else:
+                straight = 2
+                most = int(math.ceil(len(holding) * (3 / 4)))
+                if most > straight:
+                    straight = range(most, straight - 1, -1)
+                else:
+                    auxiliary = [ 1 ] * straight
+        elif hand == Pattern.Straight_x3_2n:
+            pointed = 3
+            if handed == hand:
+                straight = int(len(board.stack[-1].cards) / 5)
+                auxiliary = [ 2 ] * straight
+            else:
+                straight = 2
+                most = int(math.ceil(len(holding) * (4 / 5)))
+                if most > straight:
+                    straight = range(most, straight - 1, -1)
+                else:
+                    auxiliary = [ 2 ] * straight
+
+        def pick(possibilities, player, indices, auxiliary, straight):
+            cond = None
+            if straight != None:
+                cond = lambda c: c.index != Points.Kidding and c.index != Points.Joker0 and c.index != Points.Joker1
+            kickers = [ [ ] ]
+            if auxiliary != None:
+                groups = Kickers.groupsOf(player.counts, auxiliary[0], Points.Kidding if straight == None else Points.Kidding - 1, indices)
+                kickers = Kickers.each(groups, indices[0], indices[-1], len(auxiliary), auxiliary[0])
+            for aux in kickers:
+                ( orders, cards, rest ) = player.pick(indices + aux, None, cond, board)
+                score = Pattern.priorityOf(cards, rest)
+
+                if orders != None and cards != None and score != None:
+                    possibilities.append(( orders, cards, score ))
+
+        runs = None if straight == None else Counts.runsOf(player.counts, pointed) # Once per call, as only chains look them up.
+        for i in range(start, len(holding)):
+            pile = holding[i]
+            if pile.count < pointed:
+                continue
+            run = 0 if runs == None else runs[pile.index - 1]
+
+            if straight == None:
+                indices = [ pile.index ] * pointed
+
+                pick(possibilities, player, indices, auxiliary, straight)
+            elif isinstance(straight, int):
+                if straight > run:
+                    continue
+
+                indices = [ ]
+                for j in range(0, straight):
+                    indices += [ pile.index + j ] * pointed
+
+                pick(possibilities, player, indices, auxiliary, straight)
+            elif isinstance(straight, list) or isinstance(straight, range):
+                for k in straight:
+                    if k > run:
+                        continue
+
+                    indices = [ ]
+                    for j in range(0, k):
+                        indices += [ pile.index + j ] * pointed
+
+                    was = auxiliary
+                    if hand == Pattern.Straight_x3_n:
+                        auxiliary = [ 1 ] * k
+                    elif hand == Pattern.Straight_x3_2n:
+                        auxiliary = [ 2 ] * k
+
+                    pick(possibilities, player, indices, auxiliary, straight)
+
+                    auxiliary = was
+
+        return possibilities
+
+Pattern.Table = Pattern.tabulate()
+
+class Kickers:
+    Chains = ( ( 1, 5 ), ( 2, 3 ), ( 3, 2 ) ) # Multiplicity and least length of every chain.
+
+    def rolesOf(counts):
+        roles = [ 0 ] * Counts.Size # Bit `m - 1` set for the points in a chain of multiplicity `m`.
+        for ( m, least ) in Kickers.Chains:
+            bit = 1 << (m - 1)
+            n = 0
+            for i in range(Points.Kidding):
+                if i < Points.Kidding - 1 and counts[i] >= m:
+                    n += 1
+                else:
+                    if n >= least:
+                        for j in range(i - n, i):
+                            roles[j] |= bit
+                    n = 0
+
+        return roles
+
+    def groupsOf(counts, width, last, body = None, every = False, roles = None):
+        if roles == None and not every:
+            rest = counts
+            if body != None:
+                rest = counts[:]
+                for i in body:
+                    rest[i - 1] -= 1
+            roles = Kickers.rolesOf(rest)
+
+        groups = { } # Candidate points by count and role in what is left, off a bomb only for `every`.
+        for i in range(1, last + 1):
+            c = counts[i - 1]
+            if c < width or (c >= 4 and not every):
+                continue
+
+            role = ( c, i ) if every else ( c, roles[i - 1] )
+            if role in groups:
+                groups[role].append(i)
+            else:
+                groups[role] = [ i ]
+
+        return list(map(lambda r: groups[r], sorted(groups.keys())))
+
+    def each(groups, low, high, n, width):
+        if n == 1:
+            for group in groups:
+                for i in group:
+                    if i < low or i > high:
+                        yield [ i ] * width
+
+                        break
+
+            return
+
+        groups = list(filter(lambda g: len(g) > 0, map(lambda g: [ i for i in g if i < low or i > high ], groups)))
+        left = [ 0 ] * (len(groups) + 1)
+        for g in range(len(groups) - 1, -1, -1):
+            left[g] = left[g + 1] + len(groups[g])
+
+        def spread(g, n):
+            if n == 0:
+                yield [ 0 ] * (len(groups) - g)
+
+                return
+            if left[g] < n:
+                return
+
+            for k in range(min(n, len(groups[g])), -1, -1):
+                for rest in spread(g + 1, n - k):
+                    yield [ k ] + rest
+
+        for takes in spread(0, n): # Points of the same count and role are alike but for rank, so only the lowest are worth taking.
+            picked = [ ]
+            for g in range(len(takes)):
+                picked += groups[g][:takes[g]]
+            picked.sort()
+
+            ret = [ ]
+            for i in picked:
+                ret += [ i ] * width
+
+            yield ret
+
+class Moves:
+    Chains = (
+        ( Pattern.Straight, 1, 0, 5 ),
+        ( Pattern.Straight_x2, 2, 0, 3 ),
+        ( Pattern.Straight_x3, 3, 0, 2 ),
+        ( Pattern.Straight_x3_n, 3, 1, 2 ),
+        ( Pattern.Straight_x3_2n, 3, 2, 2 )
+    ) # Hand, multiplicity, kicker width and least length of every chain.
+
+    def of(counts, handed = Pattern.Invalid, key = 0, length = 0, taking = None, every = False):
+        return list(Moves.each(counts, handed, key, length, taking, every))
+
+    def each(counts, handed = Pattern.Invalid, key = 0, length = 0, taking = None, every = False): # Lazily, leave `counts` untouched while iterating, `every` for kickers alike or off bombs too.
+        if handed == Pattern.Jokers:
+            return
+
+        leading = handed == Pattern.Invalid
+        bombing = not leading and handed != Pattern.Quadruple
+        low = 0 if leading else key
+
+        def takes(start, end): # Whether a body from `start` to `end` takes the point `taking`, if any.
+            return taking == None or (taking >= start and taking <= end)
+
+        groups = { }
+        roles = { }
+        def attach(hand, index, body, n, width, last):
+            inside = takes(body[0], body[-1])
+            if not inside and (taking > last or counts[taking - 1] < width or (counts[taking - 1] >= 4 and not every)):
+                return
+
+            shape = ( body[0], body[-1], len(body) )
+            kickers = groups.get(( width, last ) + shape)
+            if kickers == None:
+                if not every and not shape in roles:
+                    rest = counts[:]
+                    for i in body:
+                        rest[i - 1] -= 1
+                    roles[shape] = Kickers.rolesOf(rest)
+                kickers = Kickers.groupsOf(counts, width, last, body, every, roles.get(shape))
+                groups[( width, last ) + shape] = kickers
+            for aux in Kickers.each(kickers, body[0], body[-1], n, width):
+                if inside or taking in aux:
+                    yield ( hand, index, len(body) + len(aux), body + aux )
+
+        singles = leading or handed == Pattern.Single
+        doubles = leading or handed == Pattern.Double
+        triples = leading or handed == Pattern.Triple
+        triples_1 = leading or handed == Pattern.Triple_1
+        triples_2 = leading or handed == Pattern.Triple_2
+        quadruples = leading or handed == Pattern.Quadruple
+        quadruples_1_1 = leading or handed == Pattern.Quadruple_1_1
+        quadruples_2_2 = leading or handed == Pattern.Quadruple_2_2
+        chains = [ ]
+        for ( hand, m, w, least ) in Moves.Chains:
+            if leading:
+                chains.append(( hand, m, w, least, Points.Kidding ))
+            elif hand == handed:
+                n = length // (m + w)
+                chains.append(( hand, m, w, n, n ))
+
+        runs = [ 0, 0, 0, 0 ] # Consecutive points ending here, by multiplicity.
+        for i in range(1, Counts.Size + 1):
+            c = counts[i - 1]
+            if c == 0:
+                runs = [ 0, 0, 0, 0 ]
+
+                continue
+            if i < Points.Kidding:
+                runs[1] += 1
+                runs[2] = runs[2] + 1 if c >= 2 else 0
+                runs[3] = runs[3] + 1 if c >= 3 else 0
+            else:
+                runs = [ 0, 0, 0, 0 ]
+
+            plain = taking == None or taking == i
+            if i > low:
+                if singles and plain:
+                    yield ( Pattern.Single, i, 1, [ i ] )
+                if c >= 2 and doubles and plain:
+                    yield ( Pattern.Double, i, 2, [ i ] * 2 )
+                if c >= 3:
+                    if triples and plain:
+                        yield ( Pattern.Triple, i, 3, [ i ] * 3 )
+                    if triples_1:
+                        for move in attach(Pattern.Triple_1, i, [ i ] * 3, 1, 1, Points.Kidding):
+                            yield move
+                    if triples_2:
+                        for move in attach(Pattern.Triple_2, i, [ i ] * 3, 1, 2, Points.Kidding):
+                            yield move
+                if c >= 4:
+                    if quadruples_1_1:
+                        for move in attach(Pattern.Quadruple_1_1, i, [ i ] * 4, 2, 1, Points.Kidding):
+                            yield move
+                    if quadruples_2_2:
+                        for move in attach(Pattern.Quadruple_2_2, i, [ i ] * 4, 2, 2, Points.Kidding):
+                            yield move
+            if c >= 4 and (bombing or (quadruples and i > low)) and plain:
+                yield ( Pattern.Quadruple, i, 4, [ i ] * 4 )
+
+            for ( hand, m, w, least, most ) in chains:
+                if runs[m] < least:
+                    continue
+
+                for n in range(least, min(runs[m], most) + 1):
+                    start = i - n + 1
+                    if start <= low:
+                        continue
+
+                    body = [ ]
+                    for j in range(start, i + 1):
+                        body += [ j ] * m
+                    if w == 0:
+                        if takes(start, i):
+                            yield ( hand, start, len(body), body )
+                    else:
+                        for move in attach(hand, start, body, n, w, Points.Kidding - 1):
+                            yield move
+
+        if counts[Points.Joker0 - 1] > 0 and counts[Points.Joker1 - 1] > 0 and takes(Points.Joker0, Points.Joker1):
+            yield ( Pattern.Jokers, Points.Joker0, 2, [ Points.Joker0, Points.Joker1 ] )
+
+class Evaluator:
+    Capacity = 1 << 18
+    Turn = 144 # Strength lost per play needed to empty a hand.
+    Post = 4000 # Priority added per play needed to empty the rest of a hand.
+
+    Checked = (
+        ( 1, 1, 1, 2, 3, 4, 5, 6, 11 ),
+        ( 4, 12, 12, 12, 12, 13, 13, 13, 13 ),
+        ( 1, 1, 1, 1, 2, 2, 2, 2, 3, 3 )
+    ) # Indices of the hands always checked, e.g. 333+K and 45678, AAAA+6+2 and 222, 3333+44+55 and 44.
+
+    isRanking = False # Whether to rank moves by the plays left after them.
+    isBidding = False # Whether to bid by `Evaluator.strengthOf` rather than `Pattern.valueOf`.
+    isChecking = False # Whether to check `Evaluator.turnsOf` against `Evaluator.splitsOf`.
+
+    cache = None # `Lru` of packed counts to plays, shared by everyone.
+
+    def turnsOf(counts):
+        if Evaluator.cache == None:
+            Evaluator.cache = Lru(Evaluator.Capacity)
+        cache = Evaluator.cache
+
+        key = Canon.handOf(counts)
+        ret = cache.get(key)
+        if ret != None:
+            return ret
+
+        low = 0
+        while low < Counts.Size and counts[low] == 0:
+            low += 1
+        if low == Counts.Size:
+            return 0
+        if key in Pattern.Table:
+            return cache.put(key, 1)
+
+        counts = counts[:]
+        for move in Moves.of(counts, Pattern.Invalid, 0, 0, low + 1, True): # Some play must take the lowest point, so try only those, with any kickers.
+            for i in move[3]:
+                counts[i - 1] -= 1
+            n = 1 + Evaluator.turnsOf(counts)
+            for i in move[3]:
+                counts[i - 1] += 1
+            if ret == None or n < ret:
+                ret = n
+                if ret == 2:
+                    break
+
+        if Evaluator.isChecking and ret != Evaluator.splitsOf(counts):
+            raise Exception('Mismatched plays of ' + str(counts))
+
+        return cache.put(key, ret)
+
+    def splitsOf(counts, memo = None):
+        if memo == None:
+            memo = { }
+        key = Counts.pack(counts)
+        if key in memo:
+            return memo[key]
+
+        low = 0
+        while low < Counts.Size and counts[low] == 0:
+            low += 1
+        if low == Counts.Size:
+            return 0
+
+        best = [ None ]
+        part = [ 0 ] * Counts.Size
+        def split(i): # Tries every part taking the lowest point, plain or not.
+            if i == Counts.Size:
+                if Counts.pack(part) in Pattern.Table:
+                    n = 1 + Evaluator.splitsOf(Counts.subtract(counts, part), memo)
+                    if best[0] == None or n < best[0]:
+                        best[0] = n
+
+                return
+
+            for c in range(1 if i == low else 0, counts[i] + 1):
+                part[i] = c
+                split(i + 1)
+            part[i] = 0
+        split(low)
+        memo[key] = best[0]
+
+        return best[0] # Like `Evaluator.turnsOf`, but exhaustively and slowly.
+
+    def check(hands = 200, cards = 10, seed = 0):
+        rnd = random.Random(seed)
+        deck = [ ]
+        for i in range(Counts.Size):
+            deck += [ i + 1 ] * Counts.Deck[i]
+
+        checked = list(map(lambda h: Counts.ofIndices(h), Evaluator.Checked))
+        for k in range(hands):
+            if k % 2 == 0:
+                checked.append(Counts.ofIndices(rnd.sample(deck, rnd.randint(1, cards))))
+
+                continue
+
+            bombs = rnd.sample(range(1, Points.Kidding + 1), 2) # Every other hand holds two bombs, seldom dealt at random.
+            left = list(filter(lambda i: i not in bombs, deck))
+            checked.append(Counts.ofIndices(bombs * 4 + rnd.sample(left, rnd.randint(0, max(cards - 8, 0)))))
+
+        memo = { }
+        wrong = [ ]
+        for counts in checked:
+            if Evaluator.turnsOf(counts) != Evaluator.splitsOf(counts, memo):
+                wrong.append(counts)
+
+        return ( len(checked), wrong )
+
+    def main(args):
+        import argparse
+
+        parser = argparse.ArgumentParser(prog = 'd2.py check', description = 'Check the evaluator against every split of sampled hands.')
+        parser.add_argument('--seed', type = int, default = 0)
+        parser.add_argument('--hands', type = int, default = 200, help = 'hands sampled besides the fixed ones')
+        parser.add_argument('--cards', type = int, default = 10, help = 'most cards per sampled hand')
+        args = parser.parse_args(args)
+
+        ( n, wrong ) = Evaluator.check(args.hands, args.cards, args.seed)
+        for counts in wrong:
+            Utils.write('Mismatched: ' + str(counts) + ' takes ' + str(Evaluator.splitsOf(counts)) + ' plays, not ' + str(Evaluator.turnsOf(counts)))
+        Utils.write('Checked ' + str(n) + ' hands, ' + str(len(wrong)) + ' mismatched')
+
+        return 1 if len(wrong) > 0 else 0
+
+    def strengthOf(counts):
+        values = Points.Values
+        value = 0
+        for i in range(Counts.Size):
+            value += counts[i] * values[i]
+
+        return value - Evaluator.Turn * Evaluator.turnsOf(counts)
+
+    def priorityOf(move, counts):
+        values = Points.Values
+        value = 0
+        kidding = 0
+        for i in move[3]:
+            value += values[i - 1]
+            if i == Points.Kidding:
+                kidding += values[Points.Kidding - 1]
+
+        post = Evaluator.turnsOf(Counts.subtract(counts, Counts.ofIndices(move[3]))) * Evaluator.Post
+
+        return (move[0] + value + kidding) + post # Like `Pattern.priorityOfMove`, but by plays left.
+
+class Batch:
+    Features = [ 'hand', 'key', 'length', 'size', 'value', 'kidding', 'jokers', 'bombs', 'singles', 'doubles', 'triples' ] # Columns of `Batch.featuresOf`.
+
+    Weights = None # Packing weight of every slot, like `Counts.pack`.
+    Values = None # `Points.Values` as an array.
+    Keys = None # Sorted packed counts of `Pattern.Table`.
+    Hands = None # `( hand, key, length )` rows in the order of `Batch.Keys`.
+
+    isEnabled = False # Whether to score bids and moves in batches, needs NumPy.
+
+    def isOn():
+        return Batch.isEnabled and numpy != None
+
+    def tabulate():
+        if Batch.Keys is not None:
+            return
+
+        keys = sorted(Pattern.Table.keys())
+        Batch.Weights = numpy.array([ 1 << (Counts.Bits * i) for i in range(Counts.Size) ], dtype = numpy.int64)
+        Batch.Values = numpy.array(Points.Values, dtype = numpy.int64)
+        Batch.Hands = numpy.array(list(map(lambda k: Pattern.Table[k], keys)), dtype = numpy.int64)
+        Batch.Keys = numpy.array(keys, dtype = numpy.int64)
+
+    def countsOf(hands):
+        if isinstance(hands, numpy.ndarray):
+            return hands.astype(numpy.int64, copy = False)
+
+        ret = numpy.zeros(( len(hands), Counts.Size ), dtype = numpy.int64)
+        rows = [ ]
+        slots = [ ]
+        for i in range(len(hands)):
+            h = hands[i]
+            if len(h) > 0 and Counts.isCounts(h):
+                ret[i] = h
+            else:
+                for c in h:
+                    rows.append(i)
+                    slots.append(c.index - 1)
+        numpy.add.at(ret, ( rows, slots ), 1)
+
+        return ret
+
+    def movesOf(moves):
+        ret = numpy.zeros(( len(moves), Counts.Size ), dtype = numpy.int64)
+        rows = [ ]
+        slots = [ ]
+        for i in range(len(moves)):
+            for j in moves[i][3]:
+                rows.append(i)
+                slots.append(j - 1)
+        numpy.add.at(ret, ( rows, slots ), 1)
+
+        return ret
+
+    def lookup(counts):
+        Batch.tabulate()
+        counts = Batch.countsOf(counts)
+
+        keys = counts @ Batch.Weights
+        found = numpy.minimum(numpy.searchsorted(Batch.Keys, keys), len(Batch.Keys) - 1)
+        ret = Batch.Hands[found]
+
+        missed = Batch.Keys[found] != keys
+        if missed.any():
+            top = counts[missed].max(axis = 1)
+            first = numpy.argmax(counts[missed] == top[:, None], axis = 1) + 1
+            first[top == 0] = 0
+            ret[missed, 0] = Pattern.Invalid
+            ret[missed, 1] = first
+            ret[missed, 2] = counts[missed].sum(axis = 1)
+
+        return ret # Like `Pattern.lookup` of every row.
+
+    def valuesOf(counts):
+        Batch.tabulate()
+
+        return Batch.countsOf(counts) @ Batch.Values # Like `Pattern.valueOf`.
+
+    def strengthsOf(counts):
+        Batch.tabulate()
+        counts = Batch.countsOf(counts)
+        ( keys, rows ) = numpy.unique(counts @ Batch.Weights, return_inverse = True)
+        turns = numpy.array(list(map(lambda k: Evaluator.turnsOf(Counts.unpack(k)), keys.tolist())), dtype = numpy.int64)
+
+        return Batch.valuesOf(counts) - Evaluator.Turn * turns[rows.reshape(-1)] # Like `Evaluator.strengthOf`.
+
+    def prioritiesOf(counts, rests):
+        counts = Batch.countsOf(counts)
+        hands = Batch.lookup(counts)[:, 0]
+        kidding = counts[:, Points.Kidding - 1] * Points.valueOf(Points.Kidding)
+
+        return (hands + Batch.valuesOf(counts) + kidding) + numpy.asarray(rests) / 17 * 20000 # Like `Pattern.priorityOf`.
+
+    def scoresOf(moves, rest):
+        counts = Batch.movesOf(moves)
+        hands = numpy.array(list(map(lambda m: m[0], moves)), dtype = numpy.int64)
+        kidding = counts[:, Points.Kidding - 1] * Points.valueOf(Points.Kidding)
+        sizes = counts.sum(axis = 1)
+
+        return (hands + Batch.valuesOf(counts) + kidding) + (rest - sizes) / 17 * 20000 # Like `Pattern.priorityOfMove`.
+
+    def featuresOf(counts):
+        counts = Batch.countsOf(counts)
+        found = Batch.lookup(counts)
+        jokers = counts[:, Points.Joker0 - 1] + counts[:, Points.Joker1 - 1]
+
+        return numpy.column_stack(( # One row per hand, see `Batch.Features`.
+            found[:, 0], found[:, 1], found[:, 2],
+            counts.sum(axis = 1),
+            Batch.valuesOf(counts),
+            counts[:, Points.Kidding - 1],
+            jokers,
+            (counts == 4).sum(axis = 1) + (jokers == 2),
+            (counts == 1).sum(axis = 1),
+            (counts == 2).sum(axis = 1),
+            (counts == 3).sum(axis = 1)
+        ))
+
+    def scored(counts, hand, key, length):
+        moves = list(Moves.each(counts, hand, key, length))
+        if len(moves) == 0:
+            return [ ]
+
+        return list(zip(moves, Batch.scoresOf(moves, sum(counts)).tolist()))
+
+class Dealer:
+    Hand = 17
+    Reserved = 3
+
+    Slots = None # Slot of every card id.
+
+    def __init__(self, seed = None, batch = 4096):
+        if numpy == None:
+            raise Exception('Dealing in bulk needs NumPy')
+
+        self.random = numpy.random.default_rng(seed)
+        self.batch = batch # Deals drawn at once by `Dealer.each`.
+
+    def split(ids):
+        n = Dealer.Hand * 3
+        hands = ids[..., :n].reshape(ids.shape[:-1] + ( Dealer.Hand, 3 )).swapaxes(-1, -2)
+
+        return ( hands, ids[..., n:] ) # Dealt around like `Board.deal`.
+
+    def countsOf(ids):
+        if Dealer.Slots is None:
+            Dealer.Slots = numpy.array(list(map(lambda c: c.index - 1, Card.All)), dtype = numpy.int64)
+
+        slots = Dealer.Slots[ids]
+        shape = slots.shape[:-1]
+        slots = slots.reshape(( -1, slots.shape[-1] ))
+        rows = slots.shape[0]
+        slots = slots + (numpy.arange(rows) * Counts.Size)[:, None]
+
+        return numpy.bincount(slots.reshape(-1), minlength = rows * Counts.Size).reshape(shape + ( Counts.Size, ))
+
+    def shuffle(self, batch = None):
+        ids = numpy.arange(len(Card.All), dtype = numpy.uint8)
+
+        return self.random.permuted(numpy.tile(ids, ( batch or self.batch, 1 )), axis = 1)
+
+    def deal(self, batch = None):
+        ids = self.shuffle(batch)
+        ( hands, reserved ) = Dealer.split(ids)
+
+        return ( ids, Dealer.countsOf(hands), Dealer.countsOf(reserved) )
+
+    def each(self, deals):
+        while deals > 0:
+            ids = self.shuffle(min(self.batch, deals))
+            deals -= len(ids)
+            for row in ids:
+                yield row
+
+class Zobrist:
+    Seed = 0xd2
+    Mask = (1 << 64) - 1
+
+    Counts = None # Keyed by seat, slot then count.
+    Turns = None
+    Landlords = None
+    Hands = None
+    Keys = None
+    Lengths = None
+    Owners = None
+    Cards = None # Keyed by seat then card, for the whole board.
+
+    def mix(x): # Splitmix64 on plain integers, as `random.Random` is not there under Skulpt, see `Board.randomOf`.
+        x = (x + 0x9e3779b97f4a7c15) & Zobrist.Mask
+        z = x
+        z = ((z ^ (z >> 30)) * 0xbf58476d1ce4e5b9) & Zobrist.Mask
+        z = ((z ^ (z >> 27)) * 0x94d049bb133111eb) & Zobrist.Mask
+
+        return ( x, z ^ (z >> 31) )
+
+    def tabulate():
+        state = [ Zobrist.Seed ]
+        def keys(n):
+            ret = [ ]
+            for _ in range(n):
+                ( state[0], key ) = Zobrist.mix(state[0])
+                ret.append(key)
+
+            return ret
+
+        Zobrist.Counts = [ [ keys(5) for _ in range(Counts.Size) ] for _ in range(3) ]
+        Zobrist.Turns = keys(3)
+        Zobrist.Landlords = keys(3)
+        Zobrist.Hands = keys(Pattern.Jokers + 1)
+        Zobrist.Keys = keys(Counts.Size + 1)
+        Zobrist.Lengths = keys(21)
+        Zobrist.Owners = keys(3)
+        Zobrist.Cards = [ keys(54) for _ in range(3) ]
+
+    def countsOf(seat, counts):
+        ret = 0
+        keys = Zobrist.Counts[seat]
+        for i in range(Counts.Size):
+            ret ^= keys[i][counts[i]]
+
+        return ret
+
+    def leadOf(lead, owner):
+        if lead == None:
+            return 0
+
+        ( hand, key, length ) = lead
+
+        return Zobrist.Hands[hand] ^ Zobrist.Keys[key] ^ Zobrist.Lengths[length] ^ Zobrist.Owners[owner]
+
+    def cardOf(seat, card):
+        return Zobrist.Cards[seat][card.id]
+
+    def putOf(put):
+        if put.owner == None:
+            return 0
+
+        return Zobrist.leadOf(Pattern.lookup(put.piled()), put.owner)
+
+    def boardOf(board):
+        ret = Zobrist.putOf(board.stack[-1])
+        for seat in range(len(board.players)):
+            for c in board.players[seat].hand:
+                ret ^= Zobrist.cardOf(seat, c)
+        if board.turn != None:
+            ret ^= Zobrist.Turns[board.turn]
+        if board.landlord != None:
+            ret ^= Zobrist.Landlords[board.landlord]
+
+        return ret
+
+Zobrist.tabulate()
+
+class Canon:
+    def handOf(counts):
+        return Counts.pack(counts) # Suits never matter, only how many of every point.
+
+    def cardsOf(cards):
+        return Canon.handOf(Counts.of(cards))
+
+    def seatOf(seat, landlord):
+        return (seat - landlord) % 3 # Seats matter only relative to the landlord.
+
+    def boardOf(board, index = None):
+        return State.of(board, index).key()
+
+class State:
+    def of(board, index = None):
+        put = board.stack[-1]
+        turn = index
+        if turn == None:
+            turn = board.landlord if put.owner == None else (put.owner + 1) % 3
+        lead = None if put.owner == None else Pattern.lookup(put.piled())
+
+        return State(list(map(lambda p: p.counts, board.players)), board.landlord, turn, lead, put.owner, board.times)
+
+    def __init__(self, hands, landlord, turn, lead = None, owner = None, times = 1, signature = None):
+        self.hands = list(map(lambda h: h[:], hands)) # Rank-count vector of every seat.
+        self.sizes = list(map(sum, hands))
+        self.landlord = landlord
+        self.turn = turn
+        self.lead = None if owner == None or owner == turn else lead # `( hand, key, length )` to beat, None for leading.
+        self.owner = turn if self.lead == None else owner
+        self.times = times
+
+        self.signature = signature # Zobrist hash of the hands, by `Canon.seatOf`.
+        if signature == None:
+            self.signature = 0
+            for seat in range(3):
+                self.signature ^= Zobrist.countsOf(Canon.seatOf(seat, landlord), self.hands[seat])
+
+        self.undos = [ ]
+
+    def clone(self):
+        return State(self.hands, self.landlord, self.turn, self.lead, self.owner, self.times, self.signature)
+
+    def key(self):
+        landlord = self.landlord
+
+        return self.signature ^ Zobrist.Turns[Canon.seatOf(self.turn, landlord)] ^ Zobrist.leadOf(self.lead, Canon.seatOf(self.owner, landlord))
+
+    def moves(self):
+        counts = self.hands[self.turn]
+        if self.lead == None:
+            return Moves.of(counts)
+
+        ret = Moves.of(counts, self.lead[0], self.lead[1], self.lead[2])
+        ret.append(None)
+
+        return ret
+
+    def winner(self):
+        for seat in range(3):
+            if self.sizes[seat] == 0:
+                return seat
+
+        return None
+
+    def applyMove(self, move):
+        turn = self.turn
+        self.undos.append(( self.lead, self.owner, self.times ))
+        if move != None:
+            counts = self.hands[turn]
+            keys = Zobrist.Counts[Canon.seatOf(turn, self.landlord)]
+            for i in move[3]:
+                c = counts[i - 1]
+                self.signature ^= keys[i - 1][c] ^ keys[i - 1][c - 1]
+                counts[i - 1] = c - 1
+            self.sizes[turn] -= move[2]
+            if move[0] == Pattern.Quadruple or move[0] == Pattern.Jokers:
+                self.times *= 2
+            self.lead = move[:3]
+            self.owner = turn
+        turn = (turn + 1) % 3
+        if self.owner == turn:
+            self.lead = None
+        self.turn = turn
+
+        return self
+
+    def undoMove(self, move):
+        ( self.lead, self.owner, self.times ) = self.undos.pop()
+        turn = (self.turn + 2) % 3
+        if move != None:
+            counts = self.hands[turn]
+            keys = Zobrist.Counts[Canon.seatOf(turn, self.landlord)]
+            for i in move[3]:
+                c = counts[i - 1]
+                self.signature ^= keys[i - 1][c] ^ keys[i - 1][c + 1]
+                counts[i - 1] = c + 1
+            self.sizes[turn] += move[2]
+        self.turn = turn
+
+        return self
 
-                return possibilities
+class Endgame:
+    Threshold = 12 # Takes over when no more cards than this are left on all hands.
+    Nodes = 20000 # Node budget per move.
+    Seconds = 0.05 # Time budget per move.
+    Entries = 1 << 18 # Transposition table capacity.
 
-        pointed = 0
-        straight = None
-        auxiliary = None
-        if hand == Pattern.Single:
-            pointed = 1
-        elif hand == Pattern.Double:
-            pointed = 2
-        elif hand == Pattern.Triple:
-            pointed = 3
-        elif hand == Pattern.Triple_1:
-            pointed = 3
-            auxiliary = [ 1 ]
-        elif hand == Pattern.Triple_2:
-            pointed = 3
-            auxiliary = [ 2 ]
-        elif hand == Pattern.Quadruple_1_1:
-            pointed = 4
-            auxiliary = [ 1, 1 ]
-        elif hand == Pattern.Quadruple_2_2:
-            pointed = 4
-            auxiliary = [ 2, 2 ]
-        elif hand == Pattern.Straight:
-            pointed = 1
-            if handed == hand:
-                straight = len(board.stack[-1].cards)
-            else:
-                straight = 5
-                if len(holding) > straight:
-                    straight = range(len(holding), straight - 1, -1)
-        elif hand == Pattern.Straight_x2:
-            pointed = 2
-            if handed == hand:
-                straight = int(len(board.stack[-1].cards) / 2)
-            else:
-                straight = 3
-                most = len(holding)
-                if most > straight:
-                    straight = range(most, straight - 1, -1)
-        elif hand == Pattern.Straight_x3:
-            pointed = 3
-            if handed == hand:
-                straight = int(len(board.stack[-1].cards) / 3)
-            else:
-                straight = 2
-                most = len(holding)
-                if most > straight:
-                    straight = range(most, straight - 1, -1)
-        elif hand == Pattern.Straight_x3_n:
-            pointed = 3
-            if handed == hand:
-                straight = int(len(board.stack[-1].cards) / 4)
-                auxiliary = [ 1 ] * straight
-            else:
-                straight = 2
-                most = int(math.ceil(len(holding) * (3 / 4)))
-                if most > straight:
-                    straight = range(most, straight - 1, -1)
-                else:
-                    auxiliary = [ 1 ] * straight
-        elif hand == Pattern.Straight_x3_2n:
-            pointed = 3
-            if handed == hand:
-                straight = int(len(board.stack[-1].cards) / 5)
-                auxiliary = [ 2 ] * straight
-            else:
-                straight = 2
-                most = int(math.ceil(len(holding) * (4 / 5)))
-                if most > straight:
-                    straight = range(most, straight - 1, -1)
-                else:
-                    auxiliary = [ 2 ] * straight
+    Exact = 0
+    Lower = 1
+    Upper = 2
 
-        def pick(possibilities, player, indices, auxiliary, straight):
-            cond = None
-            if straight != None:
-                cond = lambda c: c.index != Points.Kidding and c.index != Points.Joker0 and c.index != Points.Joker1
-            ( orders, cards, rest ) = player.pick(indices, auxiliary, cond)
-            score = Pattern.priorityOf(cards, rest)
+    def __init__(self, threshold = None, nodes = None, seconds = None, entries = None):
+        self.threshold = Endgame.Threshold if threshold == None else threshold
+        self.nodes = Endgame.Nodes if nodes == None else nodes
+        self.seconds = Endgame.Seconds if seconds == None else seconds
+        self.entries = Endgame.Entries if entries == None else entries
 
-            if orders != None and cards != None and score != None:
-                possibilities.append(( orders, cards, score ))
+        self.table = { } # `State.key` to ( bound, value, best move ), share a solver to share it.
 
-        for i in range(start, len(holding)):
-            pile = holding[i]
-            if pile.count < pointed:
-                continue
+        self.visited = 0
+        self.deadline = None
+        self.aborted = False
 
-            if straight == None:
-                indices = [ pile.index ] * pointed
+    def think(self, index, board):
+        total = 0
+        for p in board.players:
+            total += len(p.hand)
+        if total > self.threshold:
+            return None
 
-                pick(possibilities, player, indices, auxiliary, straight)
-            elif isinstance(straight, int):
-                indices = [ ]
-                for j in range(0, straight):
-                    indices += [ pile.index + j ] * pointed
+        ( value, move ) = self.solve(State.of(board, index))
+        if value == None:
+            return None
 
-                pick(possibilities, player, indices, auxiliary, straight)
-            elif isinstance(straight, list) or isinstance(straight, range):
-                for k in straight:
-                    indices = [ ]
-                    for j in range(0, k):
-                        indices += [ pile.index + j ] * pointed
+        won = value > 0 if index == board.landlord else value < 0
 
-                    was = auxiliary
-                    if hand == Pattern.Straight_x3_n:
-                        auxiliary = [ 1 ] * k
-                    elif hand == Pattern.Straight_x3_2n:
-                        auxiliary = [ 2 ] * k
+        return ( won, move )
 
-                    pick(possibilities, player, indices, auxiliary, straight)
+    def solve(self, state):
+        self.visited = 0
+        self.deadline = Utils.clock() + self.seconds
+        self.aborted = False
+        if len(self.table) > self.entries:
+            self.table.clear()
 
-                    auxiliary = was
+        ret = self.search(state, -1, 1)
+        if self.aborted:
+            return ( None, None )
 
-        return possibilities
+        return ret
+
+    def search(self, state, alpha, beta):
+        self.visited += 1
+        if self.visited > self.nodes or (self.visited & 0xff == 0 and Utils.clock() > self.deadline):
+            self.aborted = True
+
+            return ( 0, None )
+
+        key = state.key()
+        window = ( alpha, beta )
+        best = None
+        entry = self.table.get(key)
+        if entry != None:
+            ( bound, value, best ) = entry
+            if bound == Endgame.Exact:
+                return ( value, best )
+            elif bound == Endgame.Lower:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return ( value, best )
+
+        moves = state.moves()
+        moves.sort(key = lambda m: 0 if m == None else -m[2])
+        if best in moves:
+            moves.remove(best)
+            moves.insert(0, best)
+
+        maximizing = state.turn == state.landlord
+        value = -2 if maximizing else 2
+        rest = state.sizes[state.turn]
+        for move in moves:
+            if move != None and move[2] == rest:
+                v = 1 if maximizing else -1
+            else:
+                state.applyMove(move)
+                ( v, _1 ) = self.search(state, alpha, beta)
+                state.undoMove(move)
+            if self.aborted:
+                return ( 0, None )
+
+            if (v > value) if maximizing else (v < value):
+                value = v
+                best = move
+            if maximizing:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                break
+
+        if value <= window[0]:
+            bound = Endgame.Upper
+        elif value >= window[1]:
+            bound = Endgame.Lower
+        else:
+            bound = Endgame.Exact
+        self.table[key] = ( bound, value, best )
+
+        return ( value, best )
 
 class Put:
     Separator = ' '
 
+    __slots__ = ( 'owner', 'hand', 'cards', 'piles' )
+
     def __init__(self):
         self.owner = None
         self.hand = Pattern.Invalid
@@ -1025,39 +2812,68 @@ class Reader:
         self.turn = turn or (lambda w: Utils.read('What is ' + w + ' put: '))
 
 class Writer:
-    def __init__(self, bye = None, win = None, lose = None):
+    def quiet():
+        ret = Writer(lambda: None, lambda: None, lambda: None, lambda _1, _2: None, lambda _1: None, lambda _1, _2, _3: None, lambda _1, _2: None, lambda _1: None)
+        ret.splitter = lambda: None
+
+        return ret
+
+    def __init__(self, bye = None, win = None, lose = None, demanded = None, landlord = None, put = None, invalid = None, table = None):
         self.splitter = (lambda: Utils.write('--------------------------------'))
         self.bye = bye or (lambda: Utils.write('Bye'))
         self.win = win or (lambda: Utils.write('Win'))
         self.lose = lose or (lambda: Utils.write('Lose'))
+        self.demanded = demanded or (lambda p, i: Utils.write(('CPU' if p.isCpu else 'YOU') + '@' + str(i) + ' demanded ' + str(p.demanding)))
+        self.landlord = landlord or (lambda p: Utils.write('The land lord is: ' + ('CPU' if p.isCpu else 'YOU')))
+        self.put = put or (lambda p, i, cards: Utils.write(('CPU' if p.isCpu else 'YOU') + '@' + str(i) + ' put cards: ' + Card.namesOf(cards)))
+        self.invalid = invalid or (lambda cards, hrt: Utils.write('Invalid put cards: ' + Card.namesOf(cards) + (' with relation ' + str(hrt[1])) if hrt != None else ''))
+        self.table = table or (lambda board: board.output())
 
 class Board:
     Over = 0
     Playing = 1
     Idle = 2
 
-    def __init__(self, reader, writer):
+    def randomOf(seed, game):
+        if Utils.isSkulpt:
+            random.seed(seed * 65536 + game)
+
+            return random
+
+        return random.Random(str(seed) + ':' + str(game))
+
+    def __init__(self, reader, writer, players = None, seed = None):
         self.reader = reader
         self.writer = writer
 
+        self.seed = seed if seed != None else random.randrange(1 << 32)
+        self.game = 0 # Deals are derived from `( seed, game )`.
+
         self.deck = [ ]
         for i in range(4):
             for j in range(13):
-                self.deck.append(Card(i + 1, j + 1))
-        self.deck.append(Card(0, Points.Joker0))
-        self.deck.append(Card(0, Points.Joker1))
+                self.deck.append(Card.of(i + 1, j + 1))
+        self.deck.append(Card.of(0, Points.Joker0))
+        self.deck.append(Card.of(0, Points.Joker1))
 
         self.times = 1
 
-        self.players = [ ]
-        self.players.append(You())
-        self.players.append(Cpu())
-        self.players.append(Cpu())
+        self.players = players or [ You(), Cpu(), Cpu() ]
 
         self.reserved = [ ]
 
         self.stack = [ Put() ]
 
+        self.turns = 0
+        self.history = [ ] # `( index, cards )` of every turn, `None` cards for passed.
+
+        self.metrics = None # Set to a `Metrics` to instrument the game.
+        self.trace = None # Trace level of this board, None for `Trace.levelOf` the global one.
+        self.decisions = deque(maxlen = Trace.Decisions) # Recent decisions on this board, see `Trace.decide`.
+
+        self.turn = None # Index of the player to put.
+        self.signature = 0 # Zobrist hash of every hand, the top put, turn and landlord, see `Zobrist.boardOf`.
+
         self.state = None # None for not started, 1 for won, -1 for lost, 0 for playing.
         self.landlord = None # None for literally none, numbers for landlord's index.
         self.winner = None # None for literally none, numbers for winner's index.
@@ -1073,29 +2889,47 @@ class Board:
         del self.stack[:]
         self.stack.append(Put())
 
+        self.turns = 0
+        del self.history[:]
+
+        self.turn = None
+        self.signature = 0
+
         self.state = None
         self.landlord = None
 
+        self.game += 1
+
     def shuffle(self):
-        random.shuffle(self.deck)
+        self.deck.sort()
+        Board.randomOf(self.seed, self.game).shuffle(self.deck)
+
+    def arrange(self, ids):
+        if len(ids) != len(self.deck) or len(set(ids)) != len(self.deck):
+            raise Exception('Invalid deal ' + str(ids))
+
+        self.deck = list(map(lambda i: Card.All[i], ids))
 
     def deal(self):
         for i in range(3):
             self.players[i].clear()
 
+        self.signature = Zobrist.boardOf(self)
+
         n = 0
         for i in range(17):
             for j in range(3):
                 self.players[j].add(self.deck[n])
+                self.hashCard(j, self.deck[n])
                 n += 1
         for i in range(3):
             self.players[i].sort()
 
-        self.reserved.append(Card(self.deck[n].suit, self.deck[n].index))
+        self.reserved.append(self.deck[n])
         n += 1
-        self.reserved.append(Card(self.deck[n].suit, self.deck[n].index))
+        self.reserved.append(self.deck[n])
         n += 1
-        self.reserved.append(Card(self.deck[n].suit, self.deck[n].index))
+        self.reserved.append(self.deck[n])
         n += 1
         self.reserved.sort()
 
@@ -1117,12 +2951,22 @@ class Board:
 
     def askDemand(self):
         evaluated = [ ]
-        for i in range(len(self.players)):
-            p = self.players[i]
-            handAndReserved = p.hand + self.reserved
-            evaluated.append(( Pattern.valueOf(handAndReserved), i ))
+        if Batch.isOn():
+            counts = Batch.countsOf(list(map(lambda p: p.hand + self.reserved, self.players)))
+            scores = Batch.strengthsOf(counts) if Evaluator.isBidding else Batch.valuesOf(counts)
+            scores = scores.tolist()
+            for i in range(len(self.players)):
+                evaluated.append(( scores[i], i ))
+        else:
+            for i in range(len(self.players)):
+                p = self.players[i]
+                handAndReserved = p.hand + self.reserved
+                if Evaluator.isBidding:
+                    evaluated.append(( Evaluator.strengthOf(Counts.of(handAndReserved)), i ))
+                else:
+                    evaluated.append(( Pattern.valueOf(handAndReserved), i ))
         evaluated.sort(key = lambda e: -e[0])
-        Utils.debug('Evaluated with reserved: ' + str(evaluated))
+        Trace.debug(lambda: 'Evaluated with reserved: ' + str(evaluated), self)
 
         indices = [ ]
         for i in range(len(self.players)):
@@ -1137,7 +2981,7 @@ class Board:
                 p = self.players[i]
                 while not p.demand(i, self, evaluated):
                     yield True
-                print(('CPU' if p.isCpu else 'YOU') + '@' + str(i) + ' demanded ' + str(p.demanding))
+                self.writer.demanded(p, i)
 
                 if p.demanding > m:
                     m = p.demanding
@@ -1153,12 +2997,14 @@ class Board:
                     del indices[j]
 
         self.landlord = indices[0]
+        self.signature ^= Zobrist.Landlords[self.landlord]
         p = self.players[indices[0]]
         p.isLandlord = True
         for c in self.reserved:
             p.add(c)
+            self.hashCard(self.landlord, c)
         p.sort()
-        print('The land lord is: ' + ('CPU' if p.isCpu else 'YOU'))
+        self.writer.landlord(p)
 
         yield True
 
@@ -1175,26 +3021,33 @@ class Board:
 
         while self.state == 0:
             for i in indices:
+                self.hashTurn(i)
                 while True:
                     p = self.players[i]
                     u = [ None, None ]
-                    while not p.think(i, self, u):
+                    while not self.measure('think', p.think, i, self, u):
                         yield Board.Idle
 
-                    hrt = self.checkPuttable(u, i)
+                    hrt = self.measure('checkPuttable', self.checkPuttable, u, i)
+                    if self.metrics != None:
+                        self.metrics.count('turns')
                     possible = hrt != None and hrt[1] > 0
                     done = u[0] != None and u[1] != None
                     if possible and done:
-                        print(('CPU' if p.isCpu else 'YOU') + '@' + str(i) + ' put cards: ' + Card.namesOf(u[1]))
+                        self.writer.put(p, i, u[1])
                         put = Put()
                         put.owner = i
                         put.hand = hrt[0]
                         for j in range(len(u[0])):
                             c = u[1][j]
-                            put.cards.append(Card(c.suit, c.index))
+                            put.cards.append(Card.of(c.suit, c.index))
                             p.remove(c)
+                            self.hashCard(i, c)
+                        self.hashPut(put)
                         self.stack.append(put)
                         self.times *= hrt[2]
+                        self.turns += 1
+                        self.history.append(( i, put.cards ))
 
                         p.put = hrt[0]
 
@@ -1202,15 +3055,17 @@ class Board:
 
                         break
                     elif possible and not done:
-                        print(('CPU' if p.isCpu else 'YOU') + '@' + str(i) + ' put cards: ' + Card.namesOf(u[1]))
+                        self.writer.put(p, i, u[1])
 
                         p.put = Pattern.Passed
+                        self.turns += 1
+                        self.history.append(( i, None ))
 
                         yield Board.Playing
 
                         break
                     else:
-                        print('Invalid put cards: ' + Card.namesOf(u[1]) + (' with relation ' + str(hrt[1])) if hrt != None else '')
+                        self.writer.invalid(u[1], hrt)
 
                         p.put = Pattern.Invalid
 
@@ -1221,15 +3076,40 @@ class Board:
 
         yield Board.Over
 
+    def hashCard(self, index, card):
+        self.signature ^= Zobrist.cardOf(index, card)
+
+    def hashTurn(self, index):
+        if self.turn != None:
+            self.signature ^= Zobrist.Turns[self.turn]
+        self.turn = index
+        if index != None:
+            self.signature ^= Zobrist.Turns[index]
+
+    def hashPut(self, put):
+        self.signature ^= Zobrist.putOf(self.stack[-1]) ^ Zobrist.putOf(put)
+
+    def measure(self, phase, proc, *args):
+        if self.metrics == None:
+            return proc(*args)
+
+        return self.metrics.measure(phase, proc, *args)
+
+    def observe(self, phase, gen):
+        if self.metrics == None:
+            return gen
+
+        return self.metrics.observe(phase, gen)
+
     def checkPuttable(self, put, index):
         if put[0] == None and put[1] == None:
             return ( Pattern.Invalid, 1, 1 )
 
-        curr = Pile.of(put[1])
+        curr = Counts.of(put[1])
         prev = self.stack[-1].piled()
         ( hand, rel, times ) = Pattern.compare(curr, prev)
 
-        mine = board.stack[-1].owner == index
+        mine = self.stack[-1].owner == index
         if mine:
             rel = 1
 
@@ -1292,14 +3172,17 @@ class Board:
             elif self.state == 0:
                 self.writer.splitter()
 
-                board.output()
+                self.writer.table(self)
 
                 if self.landlord == None:
-                    for y in self.askDemand():
+                    for y in self.observe('askDemand', self.askDemand()):
                         yield y
                 else:
-                    for y in self.askTurns():
+                    for y in self.observe('askTurns', self.askTurns()):
                         if y == Board.Over:
+                            if self.metrics != None:
+                                self.metrics.count('games')
+
                             factor = 10
 
                             winner = self.players[self.winner]
@@ -1322,7 +3205,7 @@ class Board:
                         elif y == Board.Playing:
                             self.writer.splitter()
 
-                            board.output()
+                            self.writer.table(self)
 
                             yield True
                         elif y == Board.Idle:
@@ -1369,9 +3252,413 @@ class Instantly:
     def canThink(self):
         return True
 
-# Variables.
+# Headless simulation.
+
+class Result:
+    def __init__(self, seed, game, winner, landlord, times, turns, scores, history = None, deal = None):
+        self.seed = seed
+        self.game = game
+        self.deal = deal # Card ids of the deck if dealt by `Board.arrange` rather than `Board.shuffle`.
+        self.winner = winner
+        self.landlord = landlord
+        self.times = times
+        self.turns = turns
+        self.scores = scores # Score changes of every player in this game.
+        self.history = history # `( index, ( card, ... ) )` of every turn if recorded.
+
+    def __eq__(self, other):
+        return isinstance(other, Result) and self.identity() == other.identity()
+
+    def __str__(self):
+        return '<' + str(self.seed) + ':' + str(self.game) + ', ' + str(self.winner) + ', ' + str(self.landlord) + ', x' + str(self.times) + ', ' + str(self.turns) + ', ' + str(self.scores) + '>'
+
+    def identity(self):
+        return ( self.seed, self.game, self.deal, self.winner, self.landlord, self.times, self.turns, tuple(self.scores), self.history )
+
+class Simulator:
+    def replay(result):
+        sim = Simulator(result.seed, result.history is not None)
+        sim.board.game = result.game
+
+        return sim.play(result.deal)
+
+    def __init__(self, seed = None, record = False):
+        self.board = Board(Reader(start = lambda: 'y'), Writer.quiet(), [ Cpu(), Cpu(), Cpu() ], seed)
+        self.board.trace = Trace.Off # Nobody to spoil in headless games.
+        for p in self.board.players:
+            p.wait = Instantly()
+
+        self.record = record
+
+    def bid(hands, reserved):
+        evaluated = [ ]
+        for i in range(len(hands)):
+            counts = list(map(lambda h, r: h + r, hands[i], reserved))
+            if Evaluator.isBidding:
+                evaluated.append(( Evaluator.strengthOf(counts), i ))
+            else:
+                evaluated.append(( sum(map(lambda n, v: n * v, counts, Points.Values)), i ))
+        evaluated.sort(key = lambda e: -e[0])
+
+        demanding = [ 0 ] * len(hands)
+        indices = list(range(len(hands)))
+        while len(indices) > 1:
+            m = 0
+            for i in indices:
+                d = [ n for n, v in enumerate(evaluated) if v[1] == i ][0] + 1
+                demanding[i] = 3 if d == 2 else d
+                m = max(m, demanding[i])
+                if demanding[i] == 3:
+                    break
+            indices = list(filter(lambda i: demanding[i] >= m, indices))
+
+        return indices[0] # Like `Board.askDemand` with every `Cpu.demand`.
+
+    def isQuick(self):
+        board = self.board
+        if self.record or board.metrics != None or board.trace != Trace.Off:
+            return False
+        for p in board.players:
+            if type(p) != Cpu or p.solver != None or (p.wait != None and not isinstance(p.wait, Instantly)):
+                return False
+
+        return True
+
+    def quick(self, deal):
+        board = self.board
+        game = board.game
+
+        ids = list(range(len(Card.All)))
+        if deal is None:
+            Board.randomOf(board.seed, game).shuffle(ids) # Shuffles like `Board.shuffle`.
+        else:
+            board.arrange(deal)
+            ids = list(deal)
+        hands = [ [ 0 ] * Counts.Size for _ in range(3) ]
+        for n in range(Dealer.Hand * 3):
+            hands[n % 3][Card.All[ids[n]].index - 1] += 1
+        reserved = Counts.of(map(lambda i: Card.All[i], ids[Dealer.Hand * 3:]))
+
+        landlord = Simulator.bid(hands, reserved)
+        for i in range(Counts.Size):
+            hands[landlord][i] += reserved[i]
+        state = State(hands, landlord, landlord)
+        ( winner, times ) = MonteCarlo.playout(state)
+
+        factor = 10
+        scores = [ 0 ] * 3
+        for i in range(3):
+            if winner == landlord:
+                scores[i] = (times * factor) * 2 if i == winner else -times * factor
+            else:
+                scores[i] = -(times * factor) * 2 if i == landlord else times * factor
+            board.players[i].score += scores[i]
+        board.game += 1
+
+        return Result(board.seed, game, winner, landlord, times, len(state.undos), scores, None, deal)
+
+    def play(self, deal = None):
+        if deal is not None:
+            deal = tuple(map(int, deal))
+        if self.isQuick():
+            return self.quick(deal) # Plays out on point counts only, with the same moves as `Board.play`.
+
+        board = self.board
+        game = board.game
+        scores = list(map(lambda p: p.score, board.players))
+
+        if deal is None:
+            board.shuffle()
+        else:
+            board.arrange(deal)
+        board.deal()
+        for v in board.play():
+            if v == None or v == False:
+                break
+
+        for i in range(len(scores)):
+            scores[i] = board.players[i].score - scores[i]
+        history = None
+        if self.record:
+            history = tuple(map(lambda h: ( h[0], None if h[1] == None else tuple(map(str, h[1])) ), board.history))
+        ret = Result(board.seed, game, board.winner, board.landlord, board.times, board.turns, scores, history, deal)
+
+        board.clear()
+
+        return ret
+
+    def run(self, games, deals = None):
+        if deals is None:
+            for _ in range(games):
+                yield self.play(None)
 
-board = Board(Reader(), Writer())
+            return
+
+        deals = iter(deals) # Card ids of every deck, see `Dealer.each`.
+        for _ in range(games):
+            deal = next(deals, None)
+            if deal is None: # Stops early when the deals run out.
+                return
+
+            yield self.play(deal)
+
+class Tally:
+    def __init__(self):
+        self.games = 0
+        self.landlordWins = 0
+        self.times = 0
+        self.turns = 0
+        self.scores = [ 0, 0, 0 ]
+
+    def __str__(self):
+        if self.games == 0:
+            return '<0 games>'
+
+        return '<' + str(self.games) + ' games, ' + \
+            str(round(self.landlordWins / self.games * 100, 2)) + '% landlord wins, x' + \
+            str(round(self.times / self.games, 3)) + ' times, ' + \
+            str(round(self.turns / self.games, 2)) + ' turns, ' + \
+            str(self.scores) + '>'
+
+    def add(self, result):
+        self.games += 1
+        if result.winner == result.landlord:
+            self.landlordWins += 1
+        self.times += result.times
+        self.turns += result.turns
+        for i in range(len(self.scores)):
+            self.scores[i] += result.scores[i]
+
+        return self
+
+class Tournament:
+    Shard = 256 # Games per shard.
+
+    def work(shard):
+        ( seed, first, games ) = shard
+        sim = Simulator(seed)
+        sim.board.game = first
+
+        return list(sim.run(games))
+
+    def __init__(self, games, workers = None, seed = 0, shard = None):
+        self.games = games
+        self.workers = workers
+        self.seed = seed
+        self.shard = shard or Tournament.Shard
+
+    def shards(self):
+        n = 0
+        while n < self.games:
+            games = min(self.shard, self.games - n)
+
+            yield ( self.seed, n, games )
+
+            n += games
+
+    def run(self, aggregate = None):
+        tally = Tally()
+        def gather(result):
+            tally.add(result)
+            if aggregate != None:
+                aggregate(result)
+
+        if self.workers == 1 or not Utils.isCPython:
+            for shard in self.shards():
+                for result in Tournament.work(shard):
+                    gather(result)
+
+            return tally
+
+        import multiprocessing
+
+        with multiprocessing.Pool(self.workers) as pool:
+            for results in pool.imap_unordered(Tournament.work, self.shards()):
+                for result in results:
+                    gather(result)
+
+        return tally
+
+# Benchmarks.
+
+class Benchmark:
+    Seed = 20190101
+    Tolerance = 0.1 # Slowdown ratio reported as regression.
+
+    def __init__(self, seed = None, seconds = 0.5):
+        self.seed = seed if seed != None else Benchmark.Seed
+        self.seconds = seconds
+
+    def boards(self, n):
+        ret = [ ]
+        for i in range(n):
+            board = Board(Reader(), Writer.quiet(), [ Cpu(), Cpu(), Cpu() ], self.seed)
+            board.game = i
+            board.shuffle()
+            board.deal()
+            ret.append(board)
+
+        return ret
+
+    def workloads(self):
+        leading = self.boards(16)
+        following = self.boards(16)
+        for board in following:
+            put = Put()
+            put.owner = 1
+            put.cards = board.players[1].search(1, board, Pattern.Invalid)[-1][1]
+            put.hand = Pattern.handOf(Pile.of(put.cards))
+            board.stack.append(put)
+
+        hands = [ ]
+        for board in leading:
+            for p in board.players:
+                hands.append(p.hand)
+        moves = [ ]
+        for board in leading:
+            for v in board.players[0].search(0, board, Pattern.Invalid):
+                moves.append(Pile.of(v[1]))
+
+        ret = [ ]
+        ret.append(( 'Pile.of', list(map(lambda h: lambda: Pile.of(h), hands)) ))
+        ret.append(( 'Pattern.handOf', list(map(lambda m: lambda: Pattern.handOf(m), moves)) ))
+        pairs = list(zip(moves, moves[1:] + moves[:1]))
+        ret.append(( 'Pattern.compare', list(map(lambda lr: lambda: Pattern.compare(lr[0], lr[1]), pairs)) ))
+        for hand in sorted(Pattern.Names.keys()):
+            if hand == Pattern.Invalid:
+                continue
+
+            ops = [ ]
+            for board in leading:
+                p = board.players[0]
+                ops.append((lambda b, p, h: lambda: Pattern.pickSome(b, p, 0, Counts.piled(p.counts, False), h))(board, p, hand))
+            ret.append(( 'Pattern.pickSome(' + Pattern.Names[hand] + ')', ops ))
+        ret.append(( 'Player.search(leading)', list(map(lambda b: lambda: b.players[0].search(0, b, Pattern.Invalid), leading)) ))
+        ret.append(( 'Player.search(following)', list(map(lambda b: lambda: b.players[2].search(2, b, b.stack[-1].handed(2)), following)) ))
+        ret.append(( 'Cpu.think', list(map(lambda b: lambda: b.players[2].think(2, b, [ None, None ]), leading + following)) ))
+
+        def play(sim, game):
+            sim.board.game = game
+
+            return sim.play()
+        stepped = Simulator(self.seed, True) # Recording steps the whole `Board`.
+        ret.append(( 'Board.play', list(map(lambda g: lambda: play(stepped, g), range(16))) ))
+        quick = Simulator(self.seed)
+        ret.append(( 'Simulator.quick', list(map(lambda g: lambda: play(quick, g), range(16))) ))
+
+        return ret
+
+    def measure(self, ops):
+        import tracemalloc
+
+        clock = time.perf_counter
+        for op in ops:
+            op()
+
+        laps = [ ]
+        start = clock()
+        while len(laps) < len(ops) or clock() - start < self.seconds:
+            op = ops[len(laps) % len(ops)]
+            t = clock()
+            op()
+            laps.append(clock() - t)
+        total = clock() - start
+
+        tracemalloc.start()
+        blocks = sys.getallocatedblocks()
+        peak = 0
+        for op in ops:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            op()
+            peak += tracemalloc.get_traced_memory()[1] - base
+        blocks = sys.getallocatedblocks() - blocks
+        tracemalloc.stop()
+
+        laps.sort()
+        def percentile(q):
+            return laps[min(len(laps) - 1, int(len(laps) * q))] * 1e6
+
+        return {
+            'ops': len(laps) / total,
+            'p50': percentile(0.5),
+            'p90': percentile(0.9),
+            'p99': percentile(0.99),
+            'bytes': peak / len(ops),
+            'blocks': blocks / len(ops)
+        }
+
+    def run(self, report = None):
+        ret = { }
+        for ( name, ops ) in self.workloads():
+            ret[name] = self.measure(ops)
+            if report != None:
+                report(name, ret[name])
+
+        return ret
+
+    def compare(results, baseline, tolerance = None):
+        tolerance = tolerance if tolerance != None else Benchmark.Tolerance
+
+        regressed = [ ]
+        for name in results.keys():
+            if not name in baseline:
+                continue
+
+            ratio = results[name]['ops'] / baseline[name]['ops']
+            if ratio < 1 - tolerance:
+                regressed.append(( name, ratio ))
+
+        return regressed
+
+    def format(name, result, baseline = None):
+        msg = name.ljust(36) + \
+            ('%12.1f ops/s' % result['ops']) + \
+            ('%10.1f' % result['p50']) + ('%10.1f' % result['p90']) + ('%10.1f us' % result['p99']) + \
+            ('%10.0f B' % result['bytes']) + ('%8.1f blocks' % result['blocks'])
+        if baseline != None and name in baseline:
+            msg += '  x%.2f' % (result['ops'] / baseline[name]['ops'])
+
+        return msg
+
+    def main(args):
+        import argparse
+        import json
+
+        parser = argparse.ArgumentParser(prog = 'd2.py bench', description = 'Benchmark the engine hot paths.')
+        parser.add_argument('--seed', type = int, default = Benchmark.Seed)
+        parser.add_argument('--seconds', type = float, default = 0.5, help = 'time spent per workload')
+        parser.add_argument('--save', help = 'write results to this JSON file')
+        parser.add_argument('--baseline', help = 'compare results against this JSON file')
+        parser.add_argument('--tolerance', type = float, default = Benchmark.Tolerance, help = 'allowed slowdown ratio')
+        args = parser.parse_args(args)
+
+        Utils.isDebug = False
+        Trace.level = Trace.Off
+
+        baseline = None
+        if args.baseline != None:
+            with open(args.baseline) as fp:
+                baseline = json.load(fp)
+
+        Utils.write('Workload'.ljust(36) + 'Throughput'.rjust(18) + 'p50'.rjust(10) + 'p90'.rjust(10) + 'p99'.rjust(13) + 'Alloc'.rjust(12) + 'Net'.rjust(15))
+        bench = Benchmark(args.seed, args.seconds)
+        results = bench.run(lambda name, result: Utils.write(Benchmark.format(name, result, baseline)))
+
+        if args.save != None:
+            with open(args.save, 'w') as fp:
+                json.dump(results, fp, indent = 2, sort_keys = True)
+
+        if baseline != None:
+            regressed = Benchmark.compare(results, baseline, args.tolerance)
+            for ( name, ratio ) in regressed:
+                Utils.write('Regressed: ' + name + ' at x' + ('%.2f' % ratio) + ' of baseline')
+            if len(regressed) > 0:
+                return 1
+
+        return 0
+
+# Variables.
 
 gaming = None
 
@@ -1484,8 +3771,9 @@ class Gaming:
     Over = 8
     Terminated = 9
 
-    def __init__(self, reader):
+    def __init__(self, reader, board):
         self.reader = reader
+        self.board = board
 
         self.state = Gaming.Entering
         self.play = None
@@ -1513,13 +3801,13 @@ class Gaming:
 
         print('Prepare...')
 
-        board.players[0].wait = YourWaiter()
-        board.players[1].wait = CpuWaiter()
-        board.players[2].wait = CpuWaiter()
+        self.board.players[0].wait = YourWaiter()
+        self.board.players[1].wait = CpuWaiter()
+        self.board.players[2].wait = CpuWaiter()
 
-        board.shuffle()
-        board.deal()
-        self.play = board.play()
+        self.board.shuffle()
+        self.board.deal()
+        self.play = self.board.play()
 
         self.state = Gaming.Updating
 
@@ -1529,7 +3817,7 @@ class Gaming:
 
         print('Finish...')
 
-        board.clear()
+        self.board.clear()
 
         if self.state == Gaming.Exiting:
             if self.play != None:
@@ -1588,12 +3876,12 @@ class Gaming:
             self.ltext(Suits.nameOf(card.suit), x0 + dx, y0 + 8, 5, col)
 
     def table(self):
-        p = board.players
+        p = self.board.players
 
         y = 117
         self.ltext('YOU', 8, y + 3)
         self.ltext(str(p[0].score) + '万', 20, y + 3)
-        if board.landlord == None:
+        if self.board.landlord == None:
             self.ltext(str(p[0].demanding) + ' 分', 105, y + 3)
         elif p[0].isLandlord:
             self.ltext('地主', 105, y + 3)
@@ -1612,14 +3900,14 @@ class Gaming:
                 x = 66 + (i - n / 2) * 6
                 dy = -2 if self.isPicked(i) else 0
                 a = p[0].wait.thinking and self.cursorOperate == 0 and self.cursorPick == i
-                if board.state != 0:
+                if self.board.state != 0:
                     card = False
                 self.card(x, y + dy, card, a)
 
         y = 42
         self.ltext('CPU', 117, y - 27)
         self.ltext(str(p[1].score) + '万', 114, y - 32)
-        if board.landlord == None:
+        if self.board.landlord == None:
             self.ltext(str(p[1].demanding) + ' 分', 116, y + 2)
         elif p[1].isLandlord:
             self.ltext('地主', 116, y + 2)
@@ -1637,7 +3925,7 @@ class Gaming:
         y = 42
         self.ltext('CPU', 2, y - 27)
         self.ltext(str(p[2].score) + '万', 2, y - 32)
-        if board.landlord == None:
+        if self.board.landlord == None:
             self.ltext(str(p[2].demanding) + ' 分', 2, y + 2)
         elif p[2].isLandlord:
             self.ltext('地主', 2, y + 2)
@@ -1653,17 +3941,17 @@ class Gaming:
             self.ltext('x' + str(n), 12, y - 12)
 
         y = 22
-        n = len(board.reserved)
+        n = len(self.board.reserved)
         for i in range(n):
-            card = board.reserved[i]
+            card = self.board.reserved[i]
             x = 70 + (i - n / 2) * 12
-            if board.state != 0:
+            if self.board.state != 0:
                 card = False
             self.card(x, y, card)
-        if board.state == 0:
-            self.ltext('x' + str(board.times), 85, 9)
+        if self.board.state == 0:
+            self.ltext('x' + str(self.board.times), 85, 9)
 
-        put = board.stack[-1]
+        put = self.board.stack[-1]
         y = 74
         n = len(put.cards)
         for i in range(n):
@@ -1672,18 +3960,18 @@ class Gaming:
             self.card(x, y, card)
 
     def render(self):
-        p = board.players
+        p = self.board.players
 
         self.table()
 
         if self.state == Gaming.Updating:
-            if board.state == None:
+            if self.board.state == None:
                 game.rect(28, 48, 99, 79, game.rgb(255, 255, 255), True)
                 game.rect(28, 48, 99, 79, game.rgb(80, 80, 80))
                 self.ltext('开始', 59, 58)
                 self.ltext('退出', 59, 68)
                 self.ltext('>', 54, 58 if self.cursorStart == 0 else 68)
-            elif board.state == 0 and board.landlord == None and p[0].wait.demanded == None:
+            elif self.board.state == 0 and self.board.landlord == None and p[0].wait.demanded == None:
                 y = 52
                 game.rect(28, 48, 99, 79, game.rgb(255, 255, 255), True)
                 game.rect(28, 48, 99, 79, game.rgb(80, 80, 80))
@@ -1695,17 +3983,17 @@ class Gaming:
                 self.ltext('2 分', 59, y)
                 y += 6
                 self.ltext('3 分', 59, y)
-            elif board.state == 0 and p[0].wait.thinking:
+            elif self.board.state == 0 and p[0].wait.thinking:
                 self.button('不出', 32, 79, 60, 91, self.cursorOperate == 1)
                 self.button('出牌', 68, 79, 96, 91, self.cursorOperate == 2)
         elif self.state == Gaming.Over:
-            if board.state == -1:
+            if self.board.state == -1:
                 game.rect(28, 48, 99, 79, game.rgb(255, 255, 255), True)
                 game.rect(28, 48, 99, 79, game.rgb(80, 80, 80))
                 self.ltext('胜败乃兵家常事', 47, 58)
                 self.ltext('确定', 59, 68)
                 self.ltext('>', 54, 68)
-            elif board.state == 1:
+            elif self.board.state == 1:
                 game.rect(28, 48, 99, 79, game.rgb(255, 255, 255), True)
                 game.rect(28, 48, 99, 79, game.rgb(80, 80, 80))
                 self.ltext('你赢啦！', 54, 58)
@@ -1717,10 +4005,10 @@ class Gaming:
             self.ltext(self.bye, 47, 63)
 
     def step(self):
-        p = board.players
+        p = self.board.players
 
         if self.state == Gaming.Updating:
-            if board.state == None:
+            if self.board.state == None:
                 if game.btnp('up'):
                     self.cursorStart -= 1
                     if self.cursorStart < 0:
@@ -1735,7 +4023,7 @@ class Gaming:
                         byebye = [ '重置以重新开始', '曾经沧海难为水', '除却巫山不是云', '取次花丛懒回顾', '半缘修道半缘君' ]
                         random.shuffle(byebye)
                         self.bye = byebye[0]
-            elif board.state == 0 and board.landlord == None and p[0].wait.demanded == None:
+            elif self.board.state == 0 and self.board.landlord == None and p[0].wait.demanded == None:
                 if game.btnp('up'):
                     self.cursorDemand -= 1
                     if self.cursorDemand < 0:
@@ -1747,7 +4035,7 @@ class Gaming:
                 elif game.btnp('a') or game.btnp('b'):
                     self.reader.dataDemand = self.cursorDemand
                     p[0].wait.demanded = True
-            elif board.state == 0 and p[0].wait.thinking:
+            elif self.board.state == 0 and p[0].wait.thinking:
                 if self.cursorOperate == 0:
                     if game.btnp('left'):
                         self.cursorPick -= 1
@@ -1794,19 +4082,19 @@ class Gaming:
                         p[0].wait.thought = True
                         self.clearPicked()
 
-            old = board.state
+            old = self.board.state
             ret = next(self.play)
-            if old != board.state:
+            if old != self.board.state:
                 self.reset()
 
             return ret
         elif self.state == Gaming.Over:
-            if board.state == -1:
+            if self.board.state == -1:
                 if game.btnp('a') or game.btnp('b'):
                     self.state == Gaming.Exiting
 
                     return False
-            elif board.state == 1:
+            elif self.board.state == 1:
                 if game.btnp('a') or game.btnp('b'):
                     self.state == Gaming.Exiting
 
@@ -1836,13 +4124,11 @@ def __cls__():
     game.cls(game.rgb(181, 230, 29))
 
 def __init__():
-    global board
     global gaming
 
     reader = SharedReader()
-    board.reader = reader
 
-    gaming = Gaming(reader)
+    gaming = Gaming(reader, Board(reader, Writer()))
 
 def __update__(delta):
     global gaming
@@ -1852,6 +4138,8 @@ def __update__(delta):
 # The entry for direct interpretation.
 
 def main():
+    board = Board(Reader(), Writer())
+
     while True:
         for p in board.players:
             p.wait = Instantly()
@@ -1870,4 +4158,9 @@ def main():
 
 if __name__ == '__main__':
     if Utils.isCPython:
+        if len(sys.argv) > 1 and sys.argv[1] == 'bench':
+            sys.exit(Benchmark.main(sys.argv[2:]))
+        if len(sys.argv) > 1 and sys.argv[1] == 'check':
+            sys.exit(Evaluator.main(sys.argv[2:]))
+
         main()